@@ -1,10 +1,80 @@
+import base64
+import bisect
+import click
+import csv
+import gzip
+import hashlib
+import itertools
+import json
+import math
 import os
 import sqlite3
+import queue
 import random
+import re
+import secrets
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
-from flask import Flask, g, request, redirect, url_for, render_template_string, abort
+from flask import (
+    Flask, g, request, redirect, url_for, render_template, stream_template, abort, has_request_context,
+    make_response, before_render_template, template_rendered,
+)
+from jinja2.ext import Extension
+from markupsafe import Markup
+from werkzeug.http import is_resource_modified
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only without it
+    brotli = None
 
 DATABASE = os.environ.get("DATABASE", "tournament.db")
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_BUSY_RETRIES = int(os.environ.get("DB_BUSY_RETRIES", "5"))
+DB_CACHE_SIZE_KIB = int(os.environ.get("DB_CACHE_SIZE_KIB", "8192"))
+DB_SYNCHRONOUS = os.environ.get("DB_SYNCHRONOUS", "NORMAL")
+DB_POOL_MAX_IDLE = int(os.environ.get("DB_POOL_MAX_IDLE", "16"))
+DB_POOL_MAX_OPEN = int(os.environ.get("DB_POOL_MAX_OPEN", "32"))
+DB_POOL_WAIT_SECONDS = float(os.environ.get("DB_POOL_WAIT_SECONDS", "5"))
+EVENT_LOG_SIZE = int(os.environ.get("EVENT_LOG_SIZE", "50000"))
+EVENT_LOG_PRUNE_EVERY = 1000
+SSE_POLL_SECONDS = float(os.environ.get("SSE_POLL_SECONDS", "0.5"))
+SSE_HEARTBEAT_SECONDS = float(os.environ.get("SSE_HEARTBEAT_SECONDS", "15"))
+SSE_MAX_STREAM_SECONDS = float(os.environ.get("SSE_MAX_STREAM_SECONDS", "3600"))
+SSE_BUFFER = int(os.environ.get("SSE_BUFFER", "256"))
+TOURNAMENT_CACHE_SIZE = int(os.environ.get("TOURNAMENT_CACHE_SIZE", "512"))
+TOURNAMENT_CACHE_TTL = float(os.environ.get("TOURNAMENT_CACHE_TTL", "5"))
+FRAGMENT_CACHE_SIZE = int(os.environ.get("FRAGMENT_CACHE_SIZE", "256"))
+FRAGMENT_CACHE_TTL = float(os.environ.get("FRAGMENT_CACHE_TTL", "600"))
+ROSTER_PAGE_SIZE = int(os.environ.get("ROSTER_PAGE_SIZE", "100"))
+GROUP_COMMIT = os.environ.get("GROUP_COMMIT", "") == "1"
+GROUP_COMMIT_MAX_ROWS = int(os.environ.get("GROUP_COMMIT_MAX_ROWS", "256"))
+GROUP_COMMIT_WINDOW_MS = float(os.environ.get("GROUP_COMMIT_WINDOW_MS", "2"))
+HOT_STATE = os.environ.get("HOT_STATE", "") == "1"
+HOT_STATE_SIZE = int(os.environ.get("HOT_STATE_SIZE", "8"))
+HOT_STATE_CHECK_SECONDS = float(os.environ.get("HOT_STATE_CHECK_SECONDS", "0.25"))
+ARCHIVE_AFTER_DAYS = float(os.environ.get("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_EVERY_HOURS = float(os.environ.get("ARCHIVE_EVERY_HOURS", "0"))
+FREEZE_DIR = os.environ.get("FREEZE_DIR") or os.path.join(os.path.dirname(os.path.abspath(DATABASE)), "frozen")
+FREEZE_MAX_AGE = int(os.environ.get("FREEZE_MAX_AGE", "86400"))
+ADMISSION_CONTROL = os.environ.get("ADMISSION_CONTROL", "") == "1"
+ADMISSION_IP_PER_MINUTE = float(os.environ.get("ADMISSION_IP_PER_MINUTE", "20"))
+ADMISSION_IP_BURST = float(os.environ.get("ADMISSION_IP_BURST", "5"))
+ADMISSION_CODE_PER_SECOND = float(os.environ.get("ADMISSION_CODE_PER_SECOND", "50"))
+ADMISSION_CODE_BURST = float(os.environ.get("ADMISSION_CODE_BURST", "200"))
+ADMISSION_MAX_WRITES = int(os.environ.get("ADMISSION_MAX_WRITES", "16"))
+ADMISSION_WRITE_WAIT_MS = float(os.environ.get("ADMISSION_WRITE_WAIT_MS", "50"))
+ADMISSION_PROXY_HOPS = int(os.environ.get("ADMISSION_PROXY_HOPS", "0"))
+COMPRESSION = os.environ.get("COMPRESSION", "1") == "1"
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_CACHE_SIZE = int(os.environ.get("COMPRESS_CACHE_SIZE", "256"))
+MINIFY_HTML = os.environ.get("MINIFY_HTML", "1") == "1"
+METRICS = os.environ.get("METRICS", "") == "1"
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "0"))
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "dev-secret")
@@ -24,331 +94,1396 @@ def fmt_dt(dt_iso: str) -> str:
     return dt.strftime("%b %d, %Y %I:%M %p UTC")
 
 
+_background_lock = threading.Lock()
+_background_pids = {}
+
+
+def start_per_process(name, target, prepare=None):
+    # Starts target in a daemon thread once per worker process. Threads do
+    # not survive a fork, so this runs lazily on first use in each worker
+    # rather than at import in the master. prepare(), if given, resets
+    # per-process state before the thread starts and returns its args.
+    if _background_pids.get(name) == os.getpid():
+        return
+    with _background_lock:
+        if _background_pids.get(name) != os.getpid():
+            args = prepare() if prepare else ()
+            threading.Thread(target=target, args=args, name=name, daemon=True).start()
+            _background_pids[name] = os.getpid()
+
+
 # -----------------------
 # Database helpers
 # -----------------------
-def get_db():
-    if "db" not in g:
-        g.db = sqlite3.connect(DATABASE)
-        g.db.row_factory = sqlite3.Row
-    return g.db
+# Connections are long-lived and shared by the requests of one worker
+# process: each request checks out a writer and/or a query_only reader and
+# hands them back at teardown. With WAL enabled a reader never waits on the
+# writer. A checkout pool (rather than one connection per thread) keeps the
+# connection count bounded under greenlet-based workers, where every request
+# runs in its own greenlet: at most DB_POOL_MAX_OPEN pooled connections are
+# open per worker, and a checkout beyond that waits up to
+# DB_POOL_WAIT_SECONDS for one to come back (then the request gets a 503).
+# Background threads (group commit, event hub, hot state watcher) hold one
+# dedicated connection each outside the pool, so they never wait on
+# requests that are themselves waiting on them.
+_stats_lock = threading.Lock()
+_pool_stats = {
+    "opened": 0,
+    "closed": 0,
+    "checkouts": 0,
+    "busy_retries": 0,
+    "busy_errors": 0,
+    "exhausted": 0,
+}
+_pool_lock = threading.Lock()
+_pool_cond = threading.Condition(_pool_lock)
+_pool_pid = None
+_pool_open = 0
+_idle = {False: [], True: []}
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+def _count(stat, n=1):
+    with _stats_lock:
+        _pool_stats[stat] += n
+
+
+def pool_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_pool_stats)
+    with _pool_lock:
+        stats["idle"] = len(_idle[False]) + len(_idle[True])
+        stats["open"] = _pool_open
+    return stats
+
+
+def _is_busy(exc) -> bool:
+    message = str(exc)
+    return "database is locked" in message or "database is busy" in message
+
+
+class PooledConnection:
+    # Thin wrapper so routes keep calling execute()/commit() as before, but
+    # SQLITE_BUSY that slips past busy_timeout is retried with backoff.
+
+    def __init__(self, conn, readonly):
+        self.conn = conn
+        self.readonly = readonly
+        self.pid = os.getpid()
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def _retry(self, fn, *args, in_transaction_ok=False):
+        delay = 0.01
+        for attempt in range(DB_BUSY_RETRIES + 1):
+            # A statement that fails inside an open transaction cannot be
+            # replayed on its own; only retry when nothing is half-done.
+            retryable = in_transaction_ok or not self.conn.in_transaction
+            try:
+                return fn(*args)
+            except sqlite3.OperationalError as exc:
+                if not _is_busy(exc):
+                    raise
+                if not retryable or attempt == DB_BUSY_RETRIES:
+                    _count("busy_errors")
+                    raise
+                _count("busy_retries")
+                time.sleep(delay * (1 + random.random()))
+                delay = min(delay * 2, 0.5)
+
+    def execute(self, sql, params=()):
+        return self._retry(self.conn.execute, sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self._retry(self.conn.executemany, sql, seq_of_params)
+
+    def commit(self):
+        return self._retry(self.conn.commit, in_transaction_ok=True)
+
+
+class TracedConnection:
+    # Per-request proxy handed out by get_db while instrumentation is on;
+    # times each statement into the request's trace. Row fetching after
+    # execute() is not included.
+
+    def __init__(self, pooled, trace):
+        self.pooled = pooled
+        self.trace = trace
+
+    def __getattr__(self, name):
+        return getattr(self.pooled, name)
+
+    def execute(self, sql, params=()):
+        start = time.perf_counter()
+        try:
+            return self.pooled.execute(sql, params)
+        finally:
+            self.trace.add_sql(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_params):
+        start = time.perf_counter()
+        try:
+            return self.pooled.executemany(sql, seq_of_params)
+        finally:
+            self.trace.add_sql(sql, time.perf_counter() - start)
+
+
+def _open_connection(readonly):
+    conn = sqlite3.connect(
+        DATABASE,
+        timeout=DB_BUSY_TIMEOUT_MS / 1000,
+        cached_statements=256,
+        isolation_level=None if readonly else "",
+        # Only ever used by one request at a time, but that request may not
+        # run on the thread that opened it.
+        check_same_thread=False,
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KIB}")
+    conn.execute("PRAGMA foreign_keys = ON")
+    if readonly:
+        conn.execute("PRAGMA query_only = ON")
+    _count("opened")
+    return PooledConnection(conn, readonly)
+
+
+def checkout_connection(readonly):
+    global _pool_pid, _pool_open
+    deadline = time.monotonic() + DB_POOL_WAIT_SECONDS
+    conn = spare = None
+    with _pool_cond:
+        # Drop connections inherited across fork(); SQLite handles must not
+        # be shared between processes.
+        if _pool_pid != os.getpid():
+            _pool_pid = os.getpid()
+            _pool_open = 0
+            _idle[False], _idle[True] = [], []
+        while True:
+            if _idle[readonly]:
+                conn = _idle[readonly].pop()
+                break
+            if _pool_open < DB_POOL_MAX_OPEN:
+                _pool_open += 1
+                break
+            if _idle[not readonly]:
+                # At the cap: swap an idle connection of the other kind.
+                spare = _idle[not readonly].pop()
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                _count("exhausted")
+                raise PoolExhausted()
+            _pool_cond.wait(remaining)
+    if spare is not None:
+        spare.close()
+        _count("closed")
+    if conn is None:
+        try:
+            conn = _open_connection(readonly)
+        except Exception:
+            _release_slot()
+            raise
+    _count("checkouts")
+    return conn
+
+
+def _release_slot():
+    global _pool_open
+    with _pool_cond:
+        _pool_open -= 1
+        _pool_cond.notify()
+
+
+def checkin_connection(conn):
+    # Make sure no route left a transaction (and its locks) open behind it.
+    if conn.pid != os.getpid():
+        return
+    if conn.in_transaction:
+        conn.rollback()
+    with _pool_cond:
+        if len(_idle[conn.readonly]) < DB_POOL_MAX_IDLE:
+            _idle[conn.readonly].append(conn)
+            _pool_cond.notify()
+            return
+    conn.close()
+    _count("closed")
+    _release_slot()
+
+
+def get_db(readonly=None):
+    # GET/HEAD requests read through the query_only connection; anything
+    # else gets the writer so it can read its own uncommitted changes.
+    if readonly is None:
+        readonly = has_request_context() and request.method in ("GET", "HEAD")
+    key = "db_ro" if readonly else "db"
+    if key not in g:
+        conn = checkout_connection(readonly)
+        trace = g.get("trace")
+        setattr(g, key, conn if trace is None else TracedConnection(conn, trace))
+    return getattr(g, key)
+
+
+@app.errorhandler(PoolExhausted)
+def pool_exhausted(exc):
+    response = app.response_class("Server is busy.\n", status=503, mimetype="text/plain")
+    response.headers["Retry-After"] = "1"
+    return response
 
 
 @app.teardown_appcontext
-def close_db(exception):
-    db = g.pop("db", None)
-    if db is not None:
-        db.close()
+def release_db(exception):
+    for key in ("db", "db_ro"):
+        db = g.pop(key, None)
+        if isinstance(db, TracedConnection):
+            db = db.pooled
+        if db is not None:
+            checkin_connection(db)
+
+
+@contextmanager
+def write_transaction(db):
+    # BEGIN IMMEDIATE takes the write lock up front, so whatever the block
+    # reads cannot change before it commits. Commits on exit and rolls back
+    # on any exception. Works on pooled and autocommit connections alike; a
+    # block that rolls back itself leaves nothing to commit.
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        if db.in_transaction:
+            db.rollback()
+        raise
+
+
+# Ordered schema migrations. Each entry moves the database from
+# user_version == index to index + 1; append new steps, never edit old ones.
+MIGRATIONS = [
+    (
+        """
+        CREATE TABLE IF NOT EXISTS tournaments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            code TEXT NOT NULL UNIQUE,
+            name TEXT NOT NULL,
+            registration_deadline_utc TEXT NOT NULL,
+            created_at_utc TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS players (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tournament_id INTEGER NOT NULL,
+            gamertag TEXT NOT NULL,
+            availability_days TEXT NOT NULL DEFAULT '',
+            availability_window TEXT NOT NULL DEFAULT '',
+            availability_notes TEXT NOT NULL DEFAULT '',
+            created_at_utc TEXT NOT NULL,
+            UNIQUE(tournament_id, gamertag),
+            FOREIGN KEY(tournament_id) REFERENCES tournaments(id) ON DELETE CASCADE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS tournament_meta (
+            tournament_id INTEGER PRIMARY KEY,
+            generated_at_utc TEXT,
+            rounds INTEGER NOT NULL DEFAULT 5,
+            game_types TEXT NOT NULL DEFAULT 'Type A,Type B,Type C',
+            FOREIGN KEY(tournament_id) REFERENCES tournaments(id) ON DELETE CASCADE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS matches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tournament_id INTEGER NOT NULL,
+            round_num INTEGER NOT NULL,
+            game_type TEXT NOT NULL,
+            team_a TEXT NOT NULL,
+            team_b TEXT NOT NULL,
+            winner TEXT,
+            created_at_utc TEXT NOT NULL DEFAULT (datetime('now')),
+            FOREIGN KEY(tournament_id) REFERENCES tournaments(id) ON DELETE CASCADE
+        )
+        """,
+    ),
+    (
+        # Covering index for the roster queries: filter, order and every
+        # selected column come straight from the index.
+        """
+        CREATE INDEX IF NOT EXISTS idx_players_roster ON players (
+            tournament_id, created_at_utc, gamertag,
+            availability_days, availability_window, availability_notes
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_matches_round ON matches (tournament_id, round_num)",
+    ),
+    (
+        # Change counter per tournament, bumped by every write that alters
+        # what its pages show. Drives ETags and the fragment cache.
+        """
+        CREATE TABLE IF NOT EXISTS tournament_versions (
+            tournament_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 1,
+            changed_at_utc TEXT NOT NULL,
+            FOREIGN KEY(tournament_id) REFERENCES tournaments(id) ON DELETE CASCADE
+        )
+        """,
+        """
+        INSERT OR IGNORE INTO tournament_versions (tournament_id, version, changed_at_utc)
+        SELECT id, 1, created_at_utc FROM tournaments
+        """,
+    ),
+    (
+        # Day x time-window slot every player in the match is available for
+        # (see availability_mask); NULL for matches generated before this.
+        "ALTER TABLE matches ADD COLUMN slot INTEGER",
+    ),
+    (
+        # Normalized availability (see availability_mask) so slot lookups are
+        # one bitwise predicate. The roster index is rebuilt with the mask as
+        # its last column: "& bit" cannot seek, but this way the filter is
+        # evaluated inside the covering index, in roster order, without
+        # touching the table or sorting.
+        "ALTER TABLE players ADD COLUMN availability_mask INTEGER NOT NULL DEFAULT 0",
+        "UPDATE players SET availability_mask = availability_mask(availability_days, availability_window)",
+        "DROP INDEX IF EXISTS idx_players_roster",
+        """
+        CREATE INDEX idx_players_roster ON players (
+            tournament_id, created_at_utc, gamertag,
+            availability_days, availability_window, availability_notes, availability_mask
+        )
+        """,
+    ),
+    (
+        # Change log behind the live event stream. Ids are assigned by the
+        # single SQLite writer, so they are in commit order and double as
+        # Last-Event-ID cursors. Old rows are pruned by id (see record_event).
+        """
+        CREATE TABLE IF NOT EXISTS tournament_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tournament_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            data TEXT NOT NULL,
+            created_at_utc TEXT NOT NULL,
+            FOREIGN KEY(tournament_id) REFERENCES tournaments(id) ON DELETE CASCADE
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_events_tournament ON tournament_events (tournament_id, id)",
+    ),
+    (
+        # Per-player results, maintained by set_winner so the standings page
+        # never re-tallies matches. The rank index covers the page query.
+        """
+        CREATE TABLE IF NOT EXISTS standings (
+            tournament_id INTEGER NOT NULL,
+            gamertag TEXT NOT NULL,
+            wins INTEGER NOT NULL DEFAULT 0,
+            losses INTEGER NOT NULL DEFAULT 0,
+            played INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (tournament_id, gamertag),
+            FOREIGN KEY(tournament_id) REFERENCES tournaments(id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_standings_rank ON standings (tournament_id, wins DESC, losses, gamertag, played)",
+        # Backfill from existing matches: every scheduled player gets a row,
+        # decided matches count towards wins/losses/played.
+        """
+        INSERT INTO standings (tournament_id, gamertag, wins, losses, played)
+        WITH RECURSIVE sides(tournament_id, rest, won, lost) AS (
+            SELECT tournament_id, team_a || ',', winner = 'A', winner = 'B' FROM matches
+            UNION ALL
+            SELECT tournament_id, team_b || ',', winner = 'B', winner = 'A' FROM matches
+        ),
+        seats(tournament_id, gamertag, rest, won, lost) AS (
+            SELECT tournament_id, NULL, rest, won, lost FROM sides
+            UNION ALL
+            SELECT tournament_id, trim(substr(rest, 1, instr(rest, ',') - 1)),
+                   substr(rest, instr(rest, ',') + 1), won, lost
+            FROM seats WHERE rest != ''
+        )
+        SELECT tournament_id, gamertag,
+               COALESCE(SUM(won), 0), COALESCE(SUM(lost), 0), COALESCE(SUM(won OR lost), 0)
+        FROM seats
+        WHERE gamertag IS NOT NULL
+        GROUP BY tournament_id, gamertag
+        """,
+    ),
+    (
+        # Finished tournaments moved out of the live tables by
+        # run_retention: one zlib-compressed JSON document each. Keeping the
+        # code here keeps it reserved.
+        """
+        CREATE TABLE IF NOT EXISTS tournament_archive (
+            tournament_id INTEGER PRIMARY KEY,
+            code TEXT NOT NULL UNIQUE,
+            archived_at_utc TEXT NOT NULL,
+            data BLOB NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_tournaments_deadline ON tournaments (registration_deadline_utc)",
+    ),
+    (
+        # Set by the admin's Finalize Results; no winner or roster changes
+        # after it, so the closed pages can be frozen (see freeze_page).
+        "ALTER TABLE tournament_meta ADD COLUMN finalized_at_utc TEXT",
+    ),
+    (
+        # Idempotency key of the admin form submission that generated it.
+        "ALTER TABLE tournament_meta ADD COLUMN generation_key TEXT",
+    ),
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(db) -> int:
+    # Expects an autocommit connection. BEGIN IMMEDIATE takes the write lock
+    # before reading user_version, so several workers booting at once apply
+    # each migration exactly once.
+    db.create_function("availability_mask", 2, availability_mask, deterministic=True)
+    with write_transaction(db):
+        current = db.execute("PRAGMA user_version").fetchone()[0]
+        for version in range(current, SCHEMA_VERSION):
+            for statement in MIGRATIONS[version]:
+                db.execute(statement)
+        if current < SCHEMA_VERSION:
+            db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return current
 
 
 def init_db():
-    db = get_db()
-    db.executescript("""
-    PRAGMA foreign_keys = ON;
-
-    CREATE TABLE IF NOT EXISTS tournaments (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        code TEXT NOT NULL UNIQUE,
-        name TEXT NOT NULL,
-        registration_deadline_utc TEXT NOT NULL,
-        created_at_utc TEXT NOT NULL
-    );
-
-    CREATE TABLE IF NOT EXISTS players (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        tournament_id INTEGER NOT NULL,
-        gamertag TEXT NOT NULL,
-        availability_days TEXT NOT NULL DEFAULT '',
-        availability_window TEXT NOT NULL DEFAULT '',
-        availability_notes TEXT NOT NULL DEFAULT '',
-        created_at_utc TEXT NOT NULL,
-        UNIQUE(tournament_id, gamertag),
-        FOREIGN KEY(tournament_id) REFERENCES tournaments(id) ON DELETE CASCADE
-    );
-
-    CREATE TABLE IF NOT EXISTS tournament_meta (
-        tournament_id INTEGER PRIMARY KEY,
-        generated_at_utc TEXT,
-        rounds INTEGER NOT NULL DEFAULT 5,
-        game_types TEXT NOT NULL DEFAULT 'Type A,Type B,Type C',
-        FOREIGN KEY(tournament_id) REFERENCES tournaments(id) ON DELETE CASCADE
-    );
-
-    CREATE TABLE IF NOT EXISTS matches (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        tournament_id INTEGER NOT NULL,
-        round_num INTEGER NOT NULL,
-        game_type TEXT NOT NULL,
-        team_a TEXT NOT NULL,
-        team_b TEXT NOT NULL,
-        winner TEXT,
-        created_at_utc TEXT NOT NULL DEFAULT (datetime('now')),
-        FOREIGN KEY(tournament_id) REFERENCES tournaments(id) ON DELETE CASCADE
-    );
-    """)
-    db.commit()
-
-
-@app.before_request
-def _startup():
+    db = sqlite3.connect(DATABASE, timeout=30, isolation_level=None)
+    try:
+        # Only takes effect on a new, empty database; existing ones are
+        # converted by `flask archive` (it needs a full VACUUM).
+        db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        db.execute("PRAGMA journal_mode = WAL")
+        current = migrate(db)
+    finally:
+        db.close()
+    if current > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"{DATABASE} is at schema version {current}, newer than this code ({SCHEMA_VERSION})."
+        )
+    return current
+
+
+# SQL run by the routes. Kept in one place so check-query-plans can verify
+# that every statement is served by an index.
+QUERIES = {
+    "tournament_by_code": "SELECT * FROM tournaments WHERE code = ?",
+    "tournament_by_id": "SELECT * FROM tournaments WHERE id = ?",
+    "meta": "SELECT * FROM tournament_meta WHERE tournament_id = ?",
+    "finalized": "SELECT finalized_at_utc FROM tournament_meta WHERE tournament_id = ?",
+    "join_window": """
+        SELECT t.registration_deadline_utc, m.finalized_at_utc
+        FROM tournaments t LEFT JOIN tournament_meta m ON m.tournament_id = t.id
+        WHERE t.id = ?
+    """,
+    "finalize": """
+        UPDATE tournament_meta SET finalized_at_utc = ?
+        WHERE tournament_id = ? AND generated_at_utc IS NOT NULL AND finalized_at_utc IS NULL
+    """,
+    # Roster pages are keyset-paginated on (created_at_utc, gamertag): the
+    # pair is unique per tournament and follows idx_players_roster order.
+    "roster_newest": """
+        SELECT gamertag, availability_days, availability_window, availability_notes, created_at_utc
+        FROM players
+        WHERE tournament_id = ?
+        ORDER BY created_at_utc DESC, gamertag DESC
+        LIMIT ?
+    """,
+    "roster_newest_after": """
+        SELECT gamertag, availability_days, availability_window, availability_notes, created_at_utc
+        FROM players
+        WHERE tournament_id = ? AND (created_at_utc, gamertag) < (?, ?)
+        ORDER BY created_at_utc DESC, gamertag DESC
+        LIMIT ?
+    """,
+    "roster_oldest": """
+        SELECT gamertag, availability_days, availability_window, availability_notes, created_at_utc
+        FROM players
+        WHERE tournament_id = ?
+        ORDER BY created_at_utc ASC, gamertag ASC
+        LIMIT ?
+    """,
+    "roster_oldest_after": """
+        SELECT gamertag, availability_days, availability_window, availability_notes, created_at_utc
+        FROM players
+        WHERE tournament_id = ? AND (created_at_utc, gamertag) > (?, ?)
+        ORDER BY created_at_utc ASC, gamertag ASC
+        LIMIT ?
+    """,
+    "roster_all": """
+        SELECT gamertag, availability_days, availability_window, availability_notes, created_at_utc
+        FROM players
+        WHERE tournament_id = ?
+        ORDER BY created_at_utc ASC, gamertag ASC
+    """,
+    "roster_count": "SELECT COUNT(*) FROM players WHERE tournament_id = ?",
+    "roster_oldest_in_slot": """
+        SELECT gamertag, availability_days, availability_window, availability_notes, created_at_utc
+        FROM players
+        WHERE tournament_id = ? AND availability_mask & ? != 0
+        ORDER BY created_at_utc ASC, gamertag ASC
+        LIMIT ?
+    """,
+    "roster_oldest_in_slot_after": """
+        SELECT gamertag, availability_days, availability_window, availability_notes, created_at_utc
+        FROM players
+        WHERE tournament_id = ? AND availability_mask & ? != 0 AND (created_at_utc, gamertag) > (?, ?)
+        ORDER BY created_at_utc ASC, gamertag ASC
+        LIMIT ?
+    """,
+    "roster_count_in_slot": "SELECT COUNT(*) FROM players WHERE tournament_id = ? AND availability_mask & ? != 0",
+    "insert_player": """
+        INSERT INTO players
+          (tournament_id, gamertag, availability_days, availability_window, availability_notes,
+           availability_mask, created_at_utc)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """,
+    "gamertags": "SELECT gamertag FROM players WHERE tournament_id = ? ORDER BY created_at_utc ASC",
+    "hot_roster": """
+        SELECT gamertag, availability_days, availability_window, availability_notes, availability_mask, created_at_utc
+        FROM players
+        WHERE tournament_id = ?
+        ORDER BY created_at_utc ASC, gamertag ASC
+    """,
+    "scheduling_roster": """
+        SELECT gamertag, availability_mask
+        FROM players
+        WHERE tournament_id = ?
+        ORDER BY created_at_utc ASC
+    """,
+    "matches": "SELECT * FROM matches WHERE tournament_id = ? ORDER BY round_num ASC",
+    "matches_page": """
+        SELECT * FROM matches WHERE tournament_id = ?
+        ORDER BY round_num ASC, id ASC
+        LIMIT ?
+    """,
+    "matches_page_after": """
+        SELECT * FROM matches WHERE tournament_id = ? AND (round_num, id) > (?, ?)
+        ORDER BY round_num ASC, id ASC
+        LIMIT ?
+    """,
+    "delete_matches": "DELETE FROM matches WHERE tournament_id = ?",
+    "ensure_meta": "INSERT OR IGNORE INTO tournament_meta (tournament_id) VALUES (?)",
+    # The guarded transition: only one generation can move a tournament out
+    # of the not-generated state.
+    "claim_generation": """
+        UPDATE tournament_meta SET generated_at_utc = ?, generation_key = ?
+        WHERE tournament_id = ? AND generated_at_utc IS NULL
+    """,
+    "insert_match": """
+        INSERT INTO matches (tournament_id, round_num, game_type, team_a, team_b, slot, winner)
+        VALUES (?, ?, ?, ?, ?, ?, NULL)
+    """,
+    "set_winner": "UPDATE matches SET winner = ? WHERE id = ? AND tournament_id = ?",
+    "match_result": "SELECT team_a, team_b, winner FROM matches WHERE id = ? AND tournament_id = ?",
+    "standings": """
+        SELECT gamertag, wins, losses, played
+        FROM standings
+        WHERE tournament_id = ?
+        ORDER BY wins DESC, losses ASC, gamertag ASC
+    """,
+    "standings_add": """
+        INSERT INTO standings (tournament_id, gamertag, wins, losses, played) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(tournament_id, gamertag) DO UPDATE
+        SET wins = wins + excluded.wins, losses = losses + excluded.losses, played = played + excluded.played
+    """,
+    "delete_standings": "DELETE FROM standings WHERE tournament_id = ?",
+    "archive_candidates": """
+        SELECT id FROM tournaments
+        WHERE registration_deadline_utc < ?
+        ORDER BY registration_deadline_utc ASC
+        LIMIT ?
+    """,
+    "insert_archive": """
+        INSERT INTO tournament_archive (tournament_id, code, archived_at_utc, data) VALUES (?, ?, ?, ?)
+    """,
+    # Players, meta, matches, versions, events and standings go with it
+    # (ON DELETE CASCADE, each through its tournament_id index).
+    "delete_tournament": "DELETE FROM tournaments WHERE id = ?",
+    "archived_by_code": "SELECT tournament_id, archived_at_utc, data FROM tournament_archive WHERE code = ?",
+    "archived_code": "SELECT 1 FROM tournament_archive WHERE code = ?",
+    "version": "SELECT version, changed_at_utc FROM tournament_versions WHERE tournament_id = ?",
+    "bump_version": """
+        INSERT INTO tournament_versions (tournament_id, version, changed_at_utc) VALUES (?, 1, ?)
+        ON CONFLICT(tournament_id) DO UPDATE
+        SET version = version + 1, changed_at_utc = excluded.changed_at_utc
+        RETURNING version, changed_at_utc
+    """,
+    "insert_event": """
+        INSERT INTO tournament_events (tournament_id, kind, data, created_at_utc) VALUES (?, ?, ?, ?)
+    """,
+    "prune_events": "DELETE FROM tournament_events WHERE id <= ?",
+    "events_after": """
+        SELECT id, kind, data FROM tournament_events
+        WHERE tournament_id = ? AND id > ?
+        ORDER BY id ASC
+        LIMIT ?
+    """,
+    "last_event": "SELECT MAX(id) FROM tournament_events WHERE tournament_id = ?",
+    "first_event": "SELECT MIN(id) FROM tournament_events",
+    "latest_event": "SELECT MAX(id) FROM tournament_events",
+    "new_events": """
+        SELECT id, tournament_id, kind, data FROM tournament_events
+        WHERE id > ?
+        ORDER BY id ASC
+        LIMIT ?
+    """,
+}
+
+
+def slow_query_plans(db) -> dict:
+    # Returns {query name: plan lines} for statements that fall back to a
+    # full scan or a temporary sort.
+    bad = {}
+    for name, sql in QUERIES.items():
+        params = (None,) * sql.count("?")
+        plan = [row[3] for row in db.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        if any(line.startswith("SCAN") or "TEMP B-TREE" in line for line in plan):
+            bad[name] = plan
+    return bad
+
+
+def check_query_plans() -> dict:
+    # slow_query_plans against a freshly migrated in-memory schema. Run by
+    # test_query_plans.py and `flask check-query-plans`.
+    db = sqlite3.connect(":memory:", isolation_level=None)
+    try:
+        migrate(db)
+        return slow_query_plans(db)
+    finally:
+        db.close()
+
+
+@app.cli.command("check-query-plans")
+def check_query_plans_command():
+    bad = check_query_plans()
+    for name, plan in bad.items():
+        print(f"{name}: {'; '.join(plan)}")
+    if bad:
+        raise SystemExit(1)
+    print(f"All {len(QUERIES)} route queries use indexes.")
+
+
+@app.cli.command("init-db")
+def init_db_command():
     init_db()
+    print(f"Schema at version {SCHEMA_VERSION}.")
 
 
 # -----------------------
-# Retro Space Invaders theme (CSS only)
-# -----------------------
-BASE_HTML = """
-<!doctype html>
-<html>
-<head>
-  <meta charset="utf-8">
-  <meta name="viewport" content="width=device-width, initial-scale=1">
-  <title>{{ title }}</title>
-
-  <style>
-    :root{
-      --bg: #05060a;
-      --panel: rgba(10, 18, 26, 0.78);
-      --panel-border: rgba(0, 255, 153, 0.35);
-      --text: #d7ffe7;
-      --muted: rgba(215, 255, 231, 0.72);
-      --accent: #00ff99;
-      --accent2: #7cffd5;
-      --danger: #ff5c7a;
-      --warn: #ffd166;
-      --shadow: rgba(0, 255, 153, 0.18);
-    }
+# Tournament lookup cache
+# -----------------------
+class TTLCache:
+    # Bounded LRU whose entries also expire after `ttl` seconds. Shared by
+    # all threads of a worker; each worker has its own copy.
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# tournaments rows never change after create_tournament; tournament_meta only
+# changes in generate_tournament. Other workers can see a stale meta row for
+# at most TOURNAMENT_CACHE_TTL seconds, so write paths pass fresh=True.
+tournament_cache = TTLCache(TOURNAMENT_CACHE_SIZE, TOURNAMENT_CACHE_TTL)
+
+
+def get_tournament(code, fresh=False):
+    # Returns (tournament row, meta row); either may be None.
+    key = code.upper()
+    if not fresh:
+        cached = tournament_cache.get(key)
+        if cached is not None:
+            return cached
+    db = get_db()
+    t = db.execute(QUERIES["tournament_by_code"], (key,)).fetchone()
+    if not t:
+        return None, None
+    meta = db.execute(QUERIES["meta"], (t["id"],)).fetchone()
+    tournament_cache.put(key, (t, meta))
+    return t, meta
 
-    body{
-      margin: 0;
-      color: var(--text);
-      background: radial-gradient(1200px 800px at 50% -10%, rgba(0,255,153,0.10), transparent 55%),
-                  radial-gradient(900px 600px at 20% 10%, rgba(124,255,213,0.08), transparent 60%),
-                  radial-gradient(1000px 700px at 80% 30%, rgba(255,255,255,0.04), transparent 60%),
-                  var(--bg);
-      font-family: ui-monospace, SFMono-Regular, Menlo, Monaco, Consolas, "Liberation Mono", "Courier New", monospace;
-      letter-spacing: 0.2px;
-    }
 
-    body::before{
-      content:"";
-      position: fixed;
-      inset: 0;
-      pointer-events: none;
-      background-image:
-        radial-gradient(1px 1px at 10% 20%, rgba(255,255,255,0.35) 50%, transparent 55%),
-        radial-gradient(1px 1px at 30% 80%, rgba(255,255,255,0.25) 50%, transparent 55%),
-        radial-gradient(1px 1px at 70% 30%, rgba(255,255,255,0.30) 50%, transparent 55%),
-        radial-gradient(1px 1px at 90% 60%, rgba(255,255,255,0.22) 50%, transparent 55%),
-        radial-gradient(1px 1px at 50% 50%, rgba(255,255,255,0.18) 50%, transparent 55%);
-      opacity: 0.8;
-      filter: blur(0.2px);
-      animation: drift 10s linear infinite;
-    }
+# -----------------------
+# Change versions, conditional GET and fragment cache
+# -----------------------
+def bump_version(db, tournament_id):
+    # Call inside the writing transaction, before commit. Returns the new
+    # (version, changed_at_utc) for write-through to hot_store.
+    row = db.execute(QUERIES["bump_version"], (tournament_id, utc_now().isoformat())).fetchone()
+    return row[0], row[1]
+
+
+def record_event(db, tournament_id, kind, data):
+    # Call inside the writing transaction, next to bump_version, so the event
+    # commits (and becomes visible to streams) together with the change.
+    cur = db.execute(
+        QUERIES["insert_event"], (tournament_id, kind, json.dumps(data, separators=(",", ":")), utc_now().isoformat())
+    )
+    # Keep the log small: every EVENT_LOG_PRUNE_EVERY ids, drop everything
+    # older than the newest EVENT_LOG_SIZE. A rowid range delete is cheap.
+    if cur.lastrowid % EVENT_LOG_PRUNE_EVERY == 0:
+        db.execute(QUERIES["prune_events"], (cur.lastrowid - EVENT_LOG_SIZE,))
+    return cur.lastrowid
 
-    @keyframes drift{
-      0% { transform: translateY(0); }
-      100% { transform: translateY(10px); }
-    }
 
-    body::after{
-      content:"";
-      position: fixed;
-      inset: 0;
-      pointer-events: none;
-      background:
-        linear-gradient(to bottom,
-          rgba(255,255,255,0.03),
-          rgba(255,255,255,0.00) 3px,
-          rgba(0,0,0,0.06) 4px);
-      background-size: 100% 6px;
-      mix-blend-mode: overlay;
-      opacity: 0.22;
-      animation: flicker 3.5s infinite;
-    }
+def player_event(values):
+    gamertag, days, window, notes = values[:4]
+    return {"g": gamertag, "d": days, "w": window, "n": notes}
 
-    @keyframes flicker{
-      0%, 100% { opacity: 0.20; }
-      40% { opacity: 0.25; }
-      55% { opacity: 0.18; }
-      70% { opacity: 0.24; }
-    }
 
-    .wrap{
-      max-width: 920px;
-      margin: 44px auto;
-      padding: 0 16px 50px 16px;
-      position: relative;
-    }
+def last_event_id(t) -> int:
+    return get_db().execute(QUERIES["last_event"], (t["id"],)).fetchone()[0] or 0
 
-    h1{
-      margin: 0 0 10px 0;
-      font-size: 26px;
-      text-transform: uppercase;
-      letter-spacing: 2px;
-      color: var(--accent);
-      text-shadow: 0 0 18px var(--shadow);
-    }
 
-    .subtitle{
-      margin: 0 0 16px 0;
-      color: var(--muted);
-      line-height: 1.4;
-    }
+def tournament_version(t):
+    row = get_db().execute(QUERIES["version"], (t["id"],)).fetchone()
+    if not row:
+        return 0, datetime.fromisoformat(t["created_at_utc"])
+    return row["version"], datetime.fromisoformat(row["changed_at_utc"])
 
-    .card{
-      border: 1px solid var(--panel-border);
-      background: var(--panel);
-      border-radius: 14px;
-      padding: 18px;
-      box-shadow: 0 0 0 2px rgba(0,255,153,0.07), 0 12px 40px rgba(0,0,0,0.55);
-      position: relative;
-      overflow: hidden;
-    }
 
-    .card::before{
-      content:"";
-      position:absolute;
-      inset: 0;
-      background: radial-gradient(600px 240px at 50% 0%, rgba(0,255,153,0.10), transparent 60%);
-      pointer-events:none;
-    }
+def conditional_page(etag, last_modified, build):
+    # Answers 304 without calling build() when the client already holds this
+    # version. no-cache makes browsers revalidate on every view.
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = make_response(build())
+    else:
+        response = app.response_class(status=304)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
 
-    label{
-      display:block;
-      font-size: 12px;
-      color: var(--muted);
-      text-transform: uppercase;
-      letter-spacing: 1px;
-      margin-top: 10px;
-    }
 
-    input, select{
-      width: 100%;
-      padding: 12px;
-      margin: 8px 0 10px 0;
-      box-sizing: border-box;
-      border-radius: 10px;
-      border: 1px solid rgba(0,255,153,0.35);
-      background: rgba(0,0,0,0.35);
-      color: var(--text);
-      outline: none;
-      box-shadow: inset 0 0 0 1px rgba(0,255,153,0.10);
-    }
+# Rendered roster and match lists keyed by (tournament id, version, ...).
+# A version bump makes old entries unreachable, so the TTL only bounds memory.
+fragment_cache = TTLCache(FRAGMENT_CACHE_SIZE, FRAGMENT_CACHE_TTL)
 
-    input:focus, select:focus{
-      border-color: rgba(124,255,213,0.8);
-      box-shadow: 0 0 0 3px rgba(0,255,153,0.18);
-    }
 
-    button{
-      margin-top: 10px;
-      padding: 12px 16px;
-      border-radius: 12px;
-      border: 1px solid rgba(0,255,153,0.55);
-      background: linear-gradient(180deg, rgba(0,255,153,0.18), rgba(0,255,153,0.06));
-      color: var(--accent);
-      font-weight: 700;
-      text-transform: uppercase;
-      letter-spacing: 1px;
-      cursor: pointer;
-      box-shadow: 0 0 18px rgba(0,255,153,0.12);
-    }
+def cached_fragment(key, build):
+    html = fragment_cache.get(key)
+    if html is None:
+        html = Markup(build())
+        fragment_cache.put(key, html)
+    return html
 
-    button:hover{
-      border-color: rgba(124,255,213,0.85);
-      box-shadow: 0 0 22px rgba(124,255,213,0.18);
-      transform: translateY(-1px);
-    }
 
-    button:active{
-      transform: translateY(0px);
-      box-shadow: 0 0 12px rgba(124,255,213,0.12);
-    }
+# -----------------------
+# Group commit for registrations
+# -----------------------
+# Opt-in with GROUP_COMMIT=1. Only pays off when a worker serves requests
+# concurrently (gunicorn --threads or an async worker class): signups queue
+# up, one writer thread inserts them in a single transaction, and each
+# request returns only after the commit containing its row, so a 302 still
+# means the registration is on disk.
+class PendingRegistration:
+    __slots__ = ("tournament_id", "values", "created_at", "done", "status", "error")
+
+    def __init__(self, tournament_id, values, created_at):
+        self.tournament_id = tournament_id
+        self.values = values
+        self.created_at = created_at
+        self.done = threading.Event()
+        self.status = None
+        self.error = None
+
+
+class GroupCommitWriter:
+    def __init__(self, max_rows, window):
+        self.max_rows = max_rows
+        self.window = window
+        self._lock = threading.Lock()
+        self._queue = None
+        self.batches = 0
+        self.rows = 0
+        self.largest_batch = 0
+
+    def submit(self, tournament_id, values, created_at, timeout=30) -> str:
+        # Same results as insert_registration.
+        item = PendingRegistration(tournament_id, values, created_at)
+        self._writer_queue().put(item)
+        if not item.done.wait(timeout):
+            raise RuntimeError("Registration writer did not respond.")
+        if item.error is not None:
+            raise item.error
+        return item.status
+
+    def _writer_queue(self):
+        start_per_process("group-commit", self._run, self._new_queue)
+        return self._queue
+
+    def _new_queue(self):
+        self._queue = queue.Queue()
+        return (self._queue,)
+
+    def _run(self, pending):
+        # Its own connection, outside the pool: the requests it serves may
+        # hold every pooled one while they wait for it.
+        db = _open_connection(readonly=False)
+        while True:
+            batch = [pending.get()]
+            # Whatever queued up during the previous commit goes straight in;
+            # then linger briefly for stragglers.
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_rows:
+                try:
+                    batch.append(pending.get_nowait())
+                    continue
+                except queue.Empty:
+                    pass
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._flush(db, batch)
+
+    def _flush(self, db, batch):
+        try:
+            joined, last_event, accepting = {}, {}, {}
+            with write_transaction(db):
+                for item in batch:
+                    if item.tournament_id not in accepting:
+                        accepting[item.tournament_id] = accepting_registrations(db, item.tournament_id)
+                    if not accepting[item.tournament_id]:
+                        item.status = "closed"
+                        continue
+                    # A UNIQUE violation only rolls back that one statement.
+                    try:
+                        db.execute(QUERIES["insert_player"], (item.tournament_id, *item.values, item.created_at))
+                    except sqlite3.IntegrityError:
+                        item.status = "duplicate"
+                        continue
+                    item.status = "joined"
+                    joined.setdefault(item.tournament_id, []).append((item.values, item.created_at))
+                    last_event[item.tournament_id] = record_event(
+                        db, item.tournament_id, "player_joined", player_event(item.values)
+                    )
+                versions = {tournament_id: bump_version(db, tournament_id) for tournament_id in joined}
+            for tournament_id, players in joined.items():
+                hot_store.write_through(
+                    tournament_id, versions[tournament_id], last_event[tournament_id],
+                    lambda state, players=players: state.add_players(players),
+                )
+        except Exception as exc:
+            for item in batch:
+                item.status = None
+                item.error = exc
+        finally:
+            with self._lock:
+                self.batches += 1
+                self.rows += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+            for item in batch:
+                item.done.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": GROUP_COMMIT,
+                "batches": self.batches,
+                "rows": self.rows,
+                "largest_batch": self.largest_batch,
+            }
+
+
+registration_writer = GroupCommitWriter(GROUP_COMMIT_MAX_ROWS, GROUP_COMMIT_WINDOW_MS / 1000)
+
+
+def accepting_registrations(db, tournament_id) -> bool:
+    # Call inside the write transaction. join_submit checks the deadline
+    # before queueing too, but only this check is ordered against
+    # finalize_tournament and freeze_page.
+    row = db.execute(QUERIES["join_window"], (tournament_id,)).fetchone()
+    return bool(row) and not row["finalized_at_utc"] and utc_now() <= datetime.fromisoformat(
+        row["registration_deadline_utc"]
+    )
 
-    .muted{ color: var(--muted); font-size: 13px; }
-    ul{ padding-left: 18px; }
 
-    code{
-      background: rgba(0,0,0,0.35);
-      border: 1px solid rgba(0,255,153,0.25);
-      padding: 2px 6px;
-      border-radius: 8px;
-      color: var(--accent2);
-      word-break: break-all;
-    }
+def insert_registration(tournament_id, values) -> str:
+    # "joined", "duplicate" (gamertag already registered) or "closed"
+    # (deadline passed or results finalized).
+    created_at = utc_now().isoformat()
+    if GROUP_COMMIT:
+        return registration_writer.submit(tournament_id, values, created_at)
+    db = get_db()
+    with write_transaction(db):
+        if not accepting_registrations(db, tournament_id):
+            return "closed"
+        try:
+            db.execute(QUERIES["insert_player"], (tournament_id, *values, created_at))
+        except sqlite3.IntegrityError:
+            return "duplicate"
+        version = bump_version(db, tournament_id)
+        event_id = record_event(db, tournament_id, "player_joined", player_event(values))
+    hot_store.write_through(tournament_id, version, event_id, lambda state: state.add_players([(values, created_at)]))
+    return "joined"
 
-    .hr{
-      height: 1px;
-      background: rgba(0,255,153,0.18);
-      margin: 16px 0;
-    }
 
-    .success{
-      background: rgba(0,255,153,0.08);
-      border: 1px solid rgba(0,255,153,0.35);
-      padding: 10px;
-      border-radius: 10px;
-    }
+# -----------------------
+# Hot tournament state
+# -----------------------
+# Opt-in with HOT_STATE=1. The HOT_STATE_SIZE most recently viewed
+# tournaments of a worker are held in memory (tournament row, meta, roster,
+# matches) so /join, /admin and /t render without SQL. Writes made by this
+# worker are applied write-through after they commit; a watcher thread
+# checks tournament_versions every HOT_STATE_CHECK_SECONDS (only when
+# PRAGMA data_version says something committed) and drops any entry another
+# worker or the CLI has changed, so other workers lag by at most that long.
+class HotPlayer:
+    __slots__ = (
+        "gamertag", "availability_days", "availability_window", "availability_notes",
+        "availability_mask", "created_at_utc",
+    )
 
-    .warning{
-      background: rgba(255,209,102,0.08);
-      border: 1px solid rgba(255,209,102,0.35);
-      padding: 10px;
-      border-radius: 10px;
-      color: rgba(255,245,220,0.92);
-    }
+    def __init__(self, gamertag, days, window, notes, mask, created_at):
+        self.gamertag = gamertag
+        self.availability_days = days
+        self.availability_window = window
+        self.availability_notes = notes
+        self.availability_mask = mask
+        self.created_at_utc = created_at
+
+    def __getitem__(self, key):
+        # Indexable like the sqlite3.Row it stands in for.
+        return getattr(self, key)
+
+
+class HotMatch:
+    __slots__ = ("id", "round_num", "game_type", "team_a", "team_b", "winner", "slot")
+
+    def __init__(self, id, round_num, game_type, team_a, team_b, winner, slot):
+        self.id = id
+        self.round_num = round_num
+        self.game_type = game_type
+        self.team_a = team_a
+        self.team_b = team_b
+        self.winner = winner
+        self.slot = slot
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+
+class HotTournament:
+    # Writers replace `roster` and `matches` rather than mutating them, so a
+    # request rendering from the old lists never sees a half-applied change.
+    __slots__ = ("t", "meta", "version", "changed_at", "last_event", "roster", "gamertags", "matches", "match_index")
+
+    def add_players(self, players):
+        # players: ((gamertag, days, window, notes, mask), created_at) pairs.
+        keys, rows = list(self.roster[0]), list(self.roster[1])
+        for values, created_at in players:
+            if values[0] in self.gamertags:
+                continue
+            key = (created_at, values[0])
+            i = bisect.bisect_right(keys, key)
+            keys.insert(i, key)
+            rows.insert(i, HotPlayer(*values, created_at))
+            self.gamertags.add(values[0])
+        self.roster = (keys, rows)
+
+    def set_winners(self, winners):
+        matches = list(self.matches)
+        for winner, match_id in winners:
+            i = self.match_index.get(match_id)
+            if i is not None:
+                m = matches[i]
+                matches[i] = HotMatch(m.id, m.round_num, m.game_type, m.team_a, m.team_b, winner, m.slot)
+        self.matches = matches
+
+    def roster_page(self, order, slot, after, limit):
+        # In-memory roster_newest/roster_oldest (optionally _in_slot) page
+        # and count; `after` is the decoded keyset cursor.
+        keys, rows = self.roster
+        if order == "roster_newest":
+            end = bisect.bisect_left(keys, after) if after else len(rows)
+            candidates = (rows[i] for i in range(end - 1, -1, -1))
+        else:
+            start = bisect.bisect_right(keys, after) if after else 0
+            candidates = (rows[i] for i in range(start, len(rows)))
+        if slot is None:
+            total = len(rows)
+        else:
+            bit = 1 << slot
+            candidates = (p for p in candidates if p.availability_mask & bit)
+            total = sum(1 for p in rows if p.availability_mask & bit)
+        return list(itertools.islice(candidates, limit)), total
+
+
+class HotStore:
+    def __init__(self, maxsize, interval):
+        self.maxsize = maxsize
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._ids = {}
+        # Set when get() adds an entry: its load may have raced a commit the
+        # watcher already saw, so the next tick checks even if data_version
+        # has not moved.
+        self._unchecked = False
+        self.hits = 0
+        self.loads = 0
+        self.write_throughs = 0
+        self.dropped = 0
+
+    def get(self, code):
+        # HotTournament for code, loading it on a miss; None if no such
+        # tournament.
+        self._start()
+        key = code.upper()
+        with self._lock:
+            state = self._entries.get(self._ids.get(key))
+            if state is not None:
+                self._entries.move_to_end(state.t["id"])
+                self.hits += 1
+                return state
+        state = self._load(key)
+        if state is None:
+            return None
+        with self._lock:
+            self.loads += 1
+            self._entries[state.t["id"]] = state
+            self._ids[key] = state.t["id"]
+            self._unchecked = True
+            while len(self._entries) > self.maxsize:
+                _, old = self._entries.popitem(last=False)
+                self._ids.pop(old.t["code"], None)
+        return state
+
+    def _load(self, code):
+        db = get_db(readonly=True)
+        # One read transaction, so the roster, matches and version agree.
+        db.execute("BEGIN")
+        try:
+            t = db.execute(QUERIES["tournament_by_code"], (code,)).fetchone()
+            if not t:
+                return None
+            state = HotTournament()
+            state.t = t
+            state.meta = db.execute(QUERIES["meta"], (t["id"],)).fetchone()
+            row = db.execute(QUERIES["version"], (t["id"],)).fetchone()
+            if row:
+                state.version, state.changed_at = row["version"], datetime.fromisoformat(row["changed_at_utc"])
+            else:
+                state.version, state.changed_at = 0, datetime.fromisoformat(t["created_at_utc"])
+            state.last_event = db.execute(QUERIES["last_event"], (t["id"],)).fetchone()[0] or 0
+            rows = [HotPlayer(*p) for p in db.execute(QUERIES["hot_roster"], (t["id"],))]
+            state.roster = ([(p.created_at_utc, p.gamertag) for p in rows], rows)
+            state.gamertags = {p.gamertag for p in rows}
+            state.matches = [
+                HotMatch(m["id"], m["round_num"], m["game_type"], m["team_a"], m["team_b"], m["winner"], m["slot"])
+                for m in db.execute(QUERIES["matches"], (t["id"],))
+            ]
+            state.match_index = {m.id: i for i, m in enumerate(state.matches)}
+            return state
+        finally:
+            db.execute("COMMIT")
+
+    def write_through(self, tournament_id, version, event_id, apply):
+        # Call after the commit. version is bump_version's result; the entry
+        # is only patched if it was exactly one version behind, otherwise it
+        # missed another change and is dropped for a reload.
+        if not HOT_STATE:
+            return
+        version, changed_at = version
+        with self._lock:
+            state = self._entries.get(tournament_id)
+            if state is None:
+                return
+            if state.version != version - 1:
+                self._drop(tournament_id)
+                return
+            apply(state)
+            state.version = version
+            state.changed_at = datetime.fromisoformat(changed_at)
+            state.last_event = event_id
+            self.write_throughs += 1
+
+    def invalidate(self, tournament_id):
+        with self._lock:
+            self._drop(tournament_id)
+
+    def _drop(self, tournament_id):
+        state = self._entries.pop(tournament_id, None)
+        if state is not None:
+            self._ids.pop(state.t["code"], None)
+            self.dropped += 1
+
+    def _start(self):
+        start_per_process("hot-state", self._run, self._reset)
+
+    def _reset(self):
+        # Entries inherited from the parent are not watched in this process.
+        with self._lock:
+            self._entries.clear()
+            self._ids.clear()
+        return ()
+
+    def _run(self):
+        db = _open_connection(readonly=True)
+        seen = None
+        while True:
+            time.sleep(self.interval)
+            try:
+                data_version = db.execute("PRAGMA data_version").fetchone()[0]
+                if data_version == seen and not self._unchecked:
+                    continue
+                seen = data_version
+                with self._lock:
+                    self._unchecked = False
+                    held = [(tournament_id, state.version) for tournament_id, state in self._entries.items()]
+                for tournament_id, version in held:
+                    row = db.execute(QUERIES["version"], (tournament_id,)).fetchone()
+                    if row is None or row["version"] != version:
+                        with self._lock:
+                            state = self._entries.get(tournament_id)
+                            if state is not None and state.version == version:
+                                self._drop(tournament_id)
+            except Exception:
+                app.logger.exception("Hot state check failed")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": HOT_STATE,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "loads": self.loads,
+                "write_throughs": self.write_throughs,
+                "dropped": self.dropped,
+            }
+
+
+hot_store = HotStore(HOT_STATE_SIZE, HOT_STATE_CHECK_SECONDS)
+
+
+def tournament_state(code, required=True):
+    # (t, meta, version, changed_at, last event id, HotTournament or None)
+    # for the page routes. Unknown codes 404, or return None when not
+    # required.
+    if HOT_STATE:
+        hot = hot_store.get(code)
+        if hot is None:
+            if required:
+                abort(404)
+            return None
+        return hot.t, hot.meta, hot.version, hot.changed_at, hot.last_event, hot
+    t, meta = get_tournament(code)
+    if not t:
+        if required:
+            abort(404)
+        return None
+    # Last event before the version: the stream then replays anything newer
+    # than the page, at worst an event the page already shows.
+    events_after = last_event_id(t)
+    version, changed_at = tournament_version(t)
+    return t, meta, version, changed_at, events_after, None
 
-    .closed{
-      background: rgba(255,92,122,0.08);
-      border: 1px solid rgba(255,92,122,0.35);
-      padding: 10px;
-      border-radius: 10px;
-      color: rgba(255,230,236,0.92);
-    }
 
-    .grid{
-      display: grid;
-      grid-template-columns: 1fr 1fr;
-      gap: 16px;
-    }
-    @media (max-width: 720px) { .grid { grid-template-columns: 1fr; } }
+# -----------------------
+# Frozen pages
+# -----------------------
+# Once registration closes the join page never changes (joins and imports
+# are refused after the deadline), and once the admin finalizes neither
+# does the results page. The first plain GET of each after that renders it
+# once into FREEZE_DIR as gzip; from then on the route streams that file
+# before touching the database.
+_FREEZABLE_CODE = re.compile(r"[A-Z0-9_-]{1,64}")
+
+
+def frozen_path(code, page):
+    code = code.upper()
+    if not _FREEZABLE_CODE.fullmatch(code):
+        return None
+    return os.path.join(FREEZE_DIR, f"{code}.{page}.html.gz")
+
+
+def serve_frozen(code, page):
+    # Returns None unless a frozen copy exists for this canonical URL.
+    path = frozen_path(code, page)
+    if path is None or request.args:
+        return None
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    with f:
+        st = os.fstat(f.fileno())
+        etag = f"frozen-{st.st_mtime_ns:x}-{st.st_size:x}"
+        if is_resource_modified(request.environ, etag=etag):
+            body = f.read()
+            if "gzip" in request.accept_encodings:
+                response = app.response_class(body, mimetype="text/html")
+                response.headers["Content-Encoding"] = "gzip"
+            else:
+                response = app.response_class(gzip.decompress(body), mimetype="text/html")
+        else:
+            response = app.response_class(status=304)
+    response.set_etag(etag)
+    response.vary.add("Accept-Encoding")
+    response.cache_control.public = True
+    response.cache_control.max_age = FREEZE_MAX_AGE
+    return response
+
+
+def freeze_page(code, page, tournament_id, version, build):
+    # Writes the page and serves it, or returns None to render normally.
+    path = frozen_path(code, page)
+    if path is None or request.args:
+        return None
+    try:
+        os.makedirs(FREEZE_DIR, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(gzip.compress(build().encode(), 9, mtime=0))
+        os.replace(tmp, path)
+    except OSError:
+        app.logger.exception("Could not freeze %s", path)
+        return None
+    # A join that passed its deadline check just before registration closed
+    # can still be committing. Taking the write lock waits it out; if it
+    # changed the version, drop the file and the next view freezes again.
+    # Any join that takes the lock after this one is refused.
+    db = get_db(readonly=False)
+    with write_transaction(db):
+        row = db.execute(QUERIES["version"], (tournament_id,)).fetchone()
+    if row is None or row["version"] != version:
+        unfreeze(code)
+        return None
+    return serve_frozen(code, page)
+
+
+def unfreeze(code):
+    for page in ("join", "results"):
+        path = frozen_path(code, page)
+        if path:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def ensure_not_finalized(db, tournament_id):
+    # Call inside the write transaction.
+    row = db.execute(QUERIES["finalized"], (tournament_id,)).fetchone()
+    if row and row["finalized_at_utc"]:
+        abort(409, "This tournament's results are final.")
 
-    .days-box{
-      border: 1px solid rgba(0,255,153,0.22);
-      border-radius: 12px;
-      padding: 10px;
-      background: rgba(0,0,0,0.20);
-    }
 
-    .day{
-      display: inline-flex;
-      align-items: center;
-      gap: 8px;
-      margin: 6px 10px 6px 0;
-      font-size: 13px;
-      color: rgba(215,255,231,0.90);
-    }
+# -----------------------
+# Page templates
+# -----------------------
+# Pages live in templates/ and extend base.html. They are compiled once here;
+# Jinja's cache reuses them for every response.
+class MinifyWhitespace(Extension):
+    # Drops indentation, blank lines and the line breaks after lines that
+    # hold only {% ... %} tags from template source before it is compiled,
+    # so the saving costs nothing per render. Other line breaks stay: they
+    # still separate inline elements and end // comments in scripts. No
+    # template has <pre> or textarea content to preserve.
+    def preprocess(self, source, name, filename=None):
+        source = re.sub(r"^[ \t]+", "", source, flags=re.M)
+        source = re.sub(r"^((?:\{%.*?%\}[ \t]*)+)\n", r"\1", source, flags=re.M)
+        return re.sub(r"\n{2,}", "\n", source)
+
+
+if MINIFY_HTML:
+    app.jinja_env.add_extension(MinifyWhitespace)
+
+PAGE_TEMPLATES = (
+    "home.html", "join.html", "admin.html", "tournament.html", "message.html",
+    "roster.html", "import.html", "standings.html", "_roster.html", "_matches.html", "_macros.html",
+)
+
+for _name in PAGE_TEMPLATES:
+    app.jinja_env.get_template(_name)
 
-    a{ color: var(--accent2); }
-  </style>
-</head>
+DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+TIME_WINDOWS = ["6pm-8pm", "7pm-9pm", "8pm-10pm", "8pm-11pm", "9pm-11pm"]
 
-<body>
-  <div class="wrap">
-    <h1>{{ title }}</h1>
-    <p class="subtitle">{{ subtitle }}</p>
-    <div class="card">
-      {{ body|safe }}
-    </div>
-  </div>
-</body>
-</html>
-"""
 
+def render_page(template, **context):
+    return render_template(template, **context)
 
-def render_page(title, subtitle, body):
-    return render_template_string(BASE_HTML, title=title, subtitle=subtitle, body=body)
+
+# The Retro Space Invaders theme is served as one content-hashed stylesheet,
+# so browsers fetch it once and pages carry only a <link>.
+with open(os.path.join(app.static_folder, "theme.css"), "rb") as _f:
+    THEME_CSS = _f.read()
+THEME_CSS_DIGEST = hashlib.sha256(THEME_CSS).hexdigest()[:12]
+app.jinja_env.globals["theme_digest"] = THEME_CSS_DIGEST
+
+
+@app.get("/assets/theme.<digest>.css")
+def theme_css(digest):
+    if digest != THEME_CSS_DIGEST:
+        # Pages cached from a previous deploy still point at the old hash.
+        return redirect(url_for("theme_css", digest=THEME_CSS_DIGEST))
+    response = app.response_class(THEME_CSS, mimetype="text/css")
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    response.set_etag(THEME_CSS_DIGEST)
+    return response.make_conditional(request)
 
 
 def registration_open(tournament_row) -> bool:
@@ -356,25 +1491,93 @@ def registration_open(tournament_row) -> bool:
     return utc_now() <= deadline
 
 
+def page_last_modified(t, changed_at, open_now):
+    # Closing registration changes the join/admin pages without a write.
+    if open_now:
+        return changed_at
+    return max(changed_at, datetime.fromisoformat(t["registration_deadline_utc"]))
+
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps(values).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, *types):
+    # Opaque keyset cursor -> tuple of values converted with `types`, or None.
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if len(values) != len(types):
+            raise ValueError
+        return tuple(convert(value) for convert, value in zip(types, values))
+    except (ValueError, TypeError):
+        abort(400, "Invalid page cursor.")
+
+
+def roster_cursor(player) -> str:
+    return encode_cursor(player["created_at_utc"], player["gamertag"])
+
+
+def roster_fragment(t, version, order, endpoint, slot=None, hot=None):
+    # One keyset page of the roster; order is "roster_newest" or
+    # "roster_oldest" and endpoint is the page the "More" link points at.
+    # With a slot, only players available for it are listed. With hot
+    # state the page comes from memory instead of SQL.
+    after = decode_cursor(request.args.get("after"), str, str)
+    query, count_query, params, link_args = order, "roster_count", (t["id"],), {}
+    if slot is not None:
+        query, count_query = f"{order}_in_slot", "roster_count_in_slot"
+        params += (1 << slot,)
+        link_args = {"day": request.args["day"], "window": request.args["window"]}
+
+    def build():
+        if hot is not None:
+            players, total = hot.roster_page(order, slot, after, ROSTER_PAGE_SIZE + 1)
+        else:
+            db = get_db()
+            if after:
+                rows = db.execute(QUERIES[f"{query}_after"], (*params, *after, ROSTER_PAGE_SIZE + 1))
+            else:
+                rows = db.execute(QUERIES[query], (*params, ROSTER_PAGE_SIZE + 1))
+            players = rows.fetchall()
+            total = db.execute(QUERIES[count_query], params).fetchone()[0]
+        next_after = None
+        if len(players) > ROSTER_PAGE_SIZE:
+            players = players[:ROSTER_PAGE_SIZE]
+            next_after = roster_cursor(players[-1])
+        return render_template(
+            "_roster.html",
+            players=players,
+            total=total,
+            first_url=url_for(endpoint, code=t["code"], **link_args) if after else None,
+            next_url=url_for(endpoint, code=t["code"], after=next_after, **link_args) if next_after else None,
+        )
+
+    return cached_fragment((t["id"], version, order, slot, after), build)
+
+
+def requested_slot():
+    # ?day=Tue&window=8pm-10pm -> slot index, or None when not filtering.
+    day = request.args.get("day", "").strip().lower()
+    window = request.args.get("window", "").strip().lower()
+    if not day and not window:
+        return None
+    if day not in DAY_INDEX or window not in _WINDOW_LOOKUP:
+        abort(400, "Pick a day and a time window to filter by.")
+    return DAY_INDEX[day] * len(TIME_WINDOWS) + TIME_WINDOWS.index(_WINDOW_LOOKUP[window])
+
+
 # -----------------------
 # Registration routes
 # -----------------------
 @app.get("/")
 def home():
     return render_page(
-        "Registration Link Builder",
-        "Create a tournament signup link that automatically closes after 24 hours.",
-        f"""
-        <form method="post" action="{url_for('create_tournament')}">
-          <label>Tournament Name</label>
-          <input name="name" placeholder="Example: 3v3 Tryouts" required>
-
-          <label>Tournament Code (used in the join link)</label>
-          <input name="code" placeholder="Example: TRYOUTS2026" required>
-
-          <button type="submit">Create 24-Hour Registration Link</button>
-        </form>
-        """
+        "home.html",
+        title="Registration Link Builder",
+        subtitle="Create a tournament signup link that automatically closes after 24 hours.",
     )
 
 
@@ -391,162 +1594,139 @@ def create_tournament():
 
     db = get_db()
     try:
-        db.execute(
+        if db.execute(QUERIES["archived_code"], (code,)).fetchone():
+            raise sqlite3.IntegrityError("code is archived")
+        cur = db.execute(
             "INSERT INTO tournaments (name, code, registration_deadline_utc, created_at_utc) VALUES (?, ?, ?, ?)",
             (name, code, deadline.isoformat(), created.isoformat()),
         )
+        bump_version(db, cur.lastrowid)
         db.commit()
     except sqlite3.IntegrityError:
-        return render_page("Error", "", "<p>That tournament code already exists. Please pick a different code.</p>")
+        return render_page(
+            "message.html",
+            title="Error",
+            message="That tournament code already exists. Please pick a different code.",
+        )
 
+    tournament_cache.invalidate(code)
     return redirect(url_for("admin_tournament", code=code))
 
 
 @app.get("/join/<code>")
 def join_page(code):
-    db = get_db()
-    t = db.execute("SELECT * FROM tournaments WHERE code = ?", (code.upper(),)).fetchone()
-    if not t:
-        abort(404)
-
+    frozen = serve_frozen(code, "join")
+    if frozen:
+        return frozen
+    t, meta, version, changed_at, events_after, hot = tournament_state(code)
     open_now = registration_open(t)
+    final = not open_now
 
-    players = db.execute(
-        """
-        SELECT gamertag, availability_days, availability_window, availability_notes
-        FROM players
-        WHERE tournament_id = ?
-        ORDER BY created_at_utc DESC
-        """,
-        (t["id"],),
-    ).fetchall()
-
-    player_list = ""
-    if players:
-        for p in players:
-            extras = f"{p['availability_days']} | {p['availability_window']} ET"
-            if p["availability_notes"]:
-                extras += f" | {p['availability_notes']}"
-            player_list += f"<li><b>{p['gamertag']}</b> <span class='muted'>({extras})</span></li>"
-    else:
-        player_list = "<li>No players yet</li>"
-
-    deadline_text = fmt_dt(t["registration_deadline_utc"])
-
-    if not open_now:
+    def build():
         return render_page(
-            f"Join: {t['name']}",
-            "Registration is closed.",
-            f"""
-            <div class="closed">
-              <b>Registration closed.</b><br>
-              Deadline was: <code>{deadline_text}</code>
-            </div>
-
-            <div class="hr"></div>
-
-            <h3>Registered Players ({len(players)})</h3>
-            <ul>{player_list}</ul>
-            """,
+            "join.html",
+            title=f"Join: {t['name']}",
+            subtitle=(
+                "Enter your gamertag and availability to register."
+                if open_now
+                else "Registration is closed."
+            ),
+            code=code,
+            open_now=open_now,
+            deadline_text=fmt_dt(t["registration_deadline_utc"]),
+            roster=roster_fragment(t, version, "roster_newest", "join_page", hot=hot),
+            days=DAYS,
+            time_windows=TIME_WINDOWS,
+            # Later roster pages are not live, and nothing changes once closed.
+            events_url=(
+                None if final or request.args.get("after")
+                else url_for("tournament_events", code=t["code"], after=events_after)
+            ),
         )
 
-    days = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-    day_checks = "".join(
-        [f'<label class="day"><input type="checkbox" name="days" value="{d}"> {d}</label>' for d in days]
+    if final:
+        frozen = freeze_page(code, "join", t["id"], version, build)
+        if frozen:
+            return frozen
+    return conditional_page(
+        f"join-{t['id']}-{version}-{int(open_now)}",
+        page_last_modified(t, changed_at, open_now),
+        build,
     )
 
-    time_windows = ["6pm-8pm", "7pm-9pm", "8pm-10pm", "8pm-11pm", "9pm-11pm"]
-    time_options = "".join([f'<option value="{tw}">{tw} ET</option>' for tw in time_windows])
 
-    return render_page(
-        f"Join: {t['name']}",
-        "Enter your gamertag and availability to register.",
-        f"""
-        <div class="warning">
-          <b>Registration is open for 24 hours only.</b><br>
-          Closes at: <code>{deadline_text}</code>
-        </div>
-
-        <div class="hr"></div>
-
-        <form method="post" action="{url_for('join_submit', code=code)}">
-          <label>Gamertag</label>
-          <input name="gamertag" placeholder="Example: PlayerOne" required>
-
-          <div class="grid">
-            <div>
-              <label>Days Available (ET)</label>
-              <div class="days-box">
-                {day_checks}
-              </div>
-              <p class="muted" style="margin-top:8px;">Pick all that apply.</p>
-            </div>
-
-            <div>
-              <label>Time Window (ET)</label>
-              <select name="time_window" required>
-                <option value="">-- select --</option>
-                {time_options}
-              </select>
-
-              <label>Notes (optional)</label>
-              <input name="notes" placeholder="Example: Every other Wednesday">
-            </div>
-          </div>
-
-          <button type="submit">Join Tournament</button>
-        </form>
-
-        <div class="hr"></div>
-
-        <h3>Registered Players ({len(players)})</h3>
-        <ul>{player_list}</ul>
-        """,
-    )
+_DAY_LOOKUP = {d.lower(): d for d in DAYS}
+_WINDOW_LOOKUP = {tw.lower(): tw for tw in TIME_WINDOWS}
 
 
-@app.post("/join/<code>")
-def join_submit(code):
-    gamertag = request.form.get("gamertag", "").strip()
-    days = request.form.getlist("days")
-    time_window = request.form.get("time_window", "").strip()
-    notes = request.form.get("notes", "").strip()
+def clean_registration(gamertag, days, time_window, notes):
+    # Shared by join_submit and the bulk import. Returns ((gamertag,
+    # availability_days, availability_window, notes, availability_mask),
+    # None) or (None, error message).
+    gamertag = (gamertag or "").strip()
+    time_window = (time_window or "").strip()
+    notes = (notes or "").strip()
 
     if not gamertag:
-        abort(400, "Gamertag is required.")
-    if not days:
-        abort(400, "Please select at least one day.")
+        return None, "Gamertag is required."
+    if "," in gamertag:
+        # Teams are stored as comma-joined gamertags (see team_members).
+        return None, "Gamertag cannot contain a comma."
+    picked = set()
+    for day in days:
+        day = day.strip()
+        if not day:
+            continue
+        if day.lower() not in _DAY_LOOKUP:
+            return None, f"Unknown day: {day}."
+        picked.add(_DAY_LOOKUP[day.lower()])
+    if not picked:
+        return None, "Please select at least one day."
     if not time_window:
-        abort(400, "Please select a time window.")
+        return None, "Please select a time window."
+    if time_window.lower() not in _WINDOW_LOOKUP:
+        return None, f"Unknown time window: {time_window}."
 
-    db = get_db()
-    t = db.execute("SELECT * FROM tournaments WHERE code = ?", (code.upper(),)).fetchone()
-    if not t:
-        abort(404)
+    availability_days = ",".join(d for d in DAYS if d in picked)
+    availability_window = _WINDOW_LOOKUP[time_window.lower()]
+    mask = availability_mask(availability_days, availability_window)
+    return (gamertag, availability_days, availability_window, notes, mask), None
 
-    if not registration_open(t):
-        return render_page("Registration Closed", "", "<p class='closed'><b>Registration is closed.</b></p>")
 
-    availability_days = ",".join(days)
+@app.post("/join/<code>")
+def join_submit(code):
+    values, error = clean_registration(
+        request.form.get("gamertag"),
+        request.form.getlist("days"),
+        request.form.get("time_window"),
+        request.form.get("notes"),
+    )
+    if error:
+        abort(400, error)
+    gamertag = values[0]
 
-    try:
-        db.execute(
-            """
-            INSERT INTO players
-              (tournament_id, gamertag, availability_days, availability_window, availability_notes, created_at_utc)
-            VALUES (?, ?, ?, ?, ?, ?)
-            """,
-            (t["id"], gamertag, availability_days, time_window, notes, utc_now().isoformat()),
+    t, _ = get_tournament(code)
+    if not t:
+        abort(404)
+
+    # Checked again under the write lock, but a closed tournament should not
+    # queue for it.
+    status = insert_registration(t["id"], values) if registration_open(t) else "closed"
+    if status == "closed":
+        return render_page(
+            "message.html",
+            title="Registration Closed",
+            tone="closed",
+            strong="Registration is closed.",
         )
-        db.commit()
-    except sqlite3.IntegrityError:
+    if status == "duplicate":
         return render_page(
-            "Already Registered",
-            "",
-            f"""
-            <p class="success"><b>{gamertag}</b> is already registered.</p>
-            <p><a href="{url_for('join_page', code=code)}">Back</a></p>
-            """,
+            "message.html",
+            title="Already Registered",
+            tone="success",
+            strong=gamertag,
+            message="is already registered.",
+            back_url=url_for("join_page", code=code),
         )
 
     return redirect(url_for("join_page", code=code))
@@ -555,129 +1735,329 @@ def join_submit(code):
 # -----------------------
 # Tournament generation + viewing
 # -----------------------
-def split_teams(players6):
-    team_a = players6[:3]
-    team_b = players6[3:]
-    return team_a, team_b
+# Availability is a bitmask over day x time-window slots: bit
+# day_index * len(TIME_WINDOWS) + window_index is set when the player can
+# play that whole window on that day. A longer window covers every shorter
+# one inside it, so "8pm-11pm" also sets the 8pm-10pm and 9pm-11pm bits.
+SLOT_COUNT = len(DAYS) * len(TIME_WINDOWS)
+ALL_SLOTS = (1 << SLOT_COUNT) - 1
 
 
-@app.post("/admin/<code>/generate")
-def generate_tournament(code):
-    db = get_db()
-    t = db.execute("SELECT * FROM tournaments WHERE code = ?", (code.upper(),)).fetchone()
-    if not t:
-        abort(404)
+def _window_hours(window):
+    start, end = window.split("-")
+    return tuple(int(part.rstrip("apm")) + (12 if part.endswith("pm") else 0) for part in (start, end))
 
-    players = db.execute(
-        "SELECT gamertag FROM players WHERE tournament_id = ? ORDER BY created_at_utc ASC",
-        (t["id"],)
-    ).fetchall()
-    gamertags = [p["gamertag"] for p in players]
 
-    if len(gamertags) < 6:
-        return render_page(
-            f"Admin: {t['name']}",
-            "Not enough players yet.",
-            f"""
-            <p class="closed"><b>Need at least 6 players</b> to generate a 3v3 tournament. Currently: {len(gamertags)}</p>
-            <p><a href="{url_for('admin_tournament', code=code)}">Back</a></p>
-            """,
+def _window_coverage():
+    hours = [_window_hours(tw) for tw in TIME_WINDOWS]
+    coverage = {}
+    for tw, (start, end) in zip(TIME_WINDOWS, hours):
+        coverage[tw.lower()] = sum(
+            1 << i for i, (s_start, s_end) in enumerate(hours) if start <= s_start and s_end <= end
         )
+    return coverage
 
-    meta = db.execute("SELECT * FROM tournament_meta WHERE tournament_id = ?", (t["id"],)).fetchone()
-    if meta and meta["generated_at_utc"]:
-        return redirect(url_for("tournament_view", code=code.upper()))
 
-    if not meta:
-        db.execute("INSERT INTO tournament_meta (tournament_id) VALUES (?)", (t["id"],))
-        db.commit()
+WINDOW_COVERAGE = _window_coverage()
+DAY_INDEX = {d.lower(): i for i, d in enumerate(DAYS)}
+
+
+def availability_mask(availability_days, availability_window) -> int:
+    windows = WINDOW_COVERAGE.get(availability_window.strip().lower(), 0)
+    mask = 0
+    for day in availability_days.split(","):
+        index = DAY_INDEX.get(day.strip().lower())
+        if index is not None:
+            mask |= windows << (index * len(TIME_WINDOWS))
+    return mask
 
-    meta = db.execute("SELECT * FROM tournament_meta WHERE tournament_id = ?", (t["id"],)).fetchone()
-    rounds = int(meta["rounds"])
-    game_types = [x.strip() for x in meta["game_types"].split(",") if x.strip()]
-    if not game_types:
-        game_types = ["Type A", "Type B", "Type C"]
-
-    db.execute("DELETE FROM matches WHERE tournament_id = ?", (t["id"],))
-    db.commit()
-
-    for r in range(1, rounds + 1):
-        picked = gamertags[:]
-        random.shuffle(picked)
-        players6 = picked[:6]
-        team_a, team_b = split_teams(players6)
-        game_type = game_types[(r - 1) % len(game_types)]
-
-        db.execute(
-            """
-            INSERT INTO matches (tournament_id, round_num, game_type, team_a, team_b, winner)
-            VALUES (?, ?, ?, ?, ?, NULL)
-            """,
-            (t["id"], r, game_type, ",".join(team_a), ",".join(team_b))
+
+@app.template_filter("slot_label")
+def slot_label(slot) -> str:
+    day, window = divmod(slot, len(TIME_WINDOWS))
+    return f"{DAYS[day]} {TIME_WINDOWS[window]} ET"
+
+
+TEAM_SIZE = 3
+MATCH_SIZE = 2 * TEAM_SIZE
+# How many candidates are compared when filling each seat. Larger windows
+# avoid more repeat pairings at the cost of generation time.
+SCHEDULE_WINDOW = 8
+
+
+def _pair_key(a, b, n):
+    return a * n + b if a < b else b * n + a
+
+
+def _draw(pool, n, *constraints):
+    # Pops the candidate, among the last SCHEDULE_WINDOW entries of pool,
+    # with the fewest prior pairings; constraints are (members, seen pairs).
+    best_pos, best_cost = len(pool) - 1, None
+    for pos in range(len(pool) - 1, max(len(pool) - 1 - SCHEDULE_WINDOW, -1), -1):
+        candidate = pool[pos]
+        cost = sum(
+            _pair_key(member, candidate, n) in seen
+            for members, seen in constraints
+            for member in members
         )
+        if best_cost is None or cost < best_cost:
+            best_pos, best_cost = pos, cost
+            if cost == 0:
+                break
+    pool[best_pos], pool[-1] = pool[-1], pool[best_pos]
+    return pool.pop()
+
+
+def build_schedule(masks, rounds, rng=random):
+    # masks[i] is player i's availability bitmask. Returns, per round, a list
+    # of (slot, team_a, team_b) with player indexes; all six players share
+    # the slot. Players are visited least-played first and each one that can
+    # still be seated opens a match, so rounds fill as far as availability
+    # allows and appearances stay balanced. Repeat teammates/opponents are
+    # avoided greedily.
+    n = len(masks)
+    slots_of = [[s for s in range(SLOT_COUNT) if mask >> s & 1] for mask in masks]
+    appearances = [0] * n
+    teammates = set()
+    opponents = set()
+    schedule = []
+
+    for _ in range(rounds):
+        order = sorted(range(n), key=lambda i: (appearances[i], rng.random()))
+        buckets = [[] for _ in range(SLOT_COUNT)]
+        for i in order:
+            for s in slots_of[i]:
+                buckets[s].append(i)
+        free = [len(bucket) for bucket in buckets]
+        heads = [0] * SLOT_COUNT
+        seated = [False] * n
+
+        matches = []
+        for first in order:
+            if seated[first]:
+                continue
+            # Open a match for the least-played unseated player, in the slot
+            # of theirs with the most unseated players; skip them if none of
+            # their slots can still seat six.
+            slot = max(slots_of[first], key=free.__getitem__, default=None)
+            if slot is None or free[slot] < MATCH_SIZE:
+                continue
+            bucket = buckets[slot]
+            while seated[bucket[heads[slot]]]:
+                heads[slot] += 1
+            candidates = []
+            pos = heads[slot]
+            while len(candidates) < MATCH_SIZE + SCHEDULE_WINDOW and pos < len(bucket):
+                if not seated[bucket[pos]]:
+                    candidates.append(bucket[pos])
+                pos += 1
+
+            pool = candidates[::-1]
+            team_a = [pool.pop()]
+            while len(team_a) < TEAM_SIZE:
+                team_a.append(_draw(pool, n, (team_a, teammates)))
+            team_b = [_draw(pool, n, (team_a, opponents))]
+            while len(team_b) < TEAM_SIZE:
+                team_b.append(_draw(pool, n, (team_b, teammates), (team_a, opponents)))
+
+            for team in (team_a, team_b):
+                for i, a in enumerate(team):
+                    seated[a] = True
+                    appearances[a] += 1
+                    for s in slots_of[a]:
+                        free[s] -= 1
+                    for b in team[i + 1 :]:
+                        teammates.add(_pair_key(a, b, n))
+            for a in team_a:
+                for b in team_b:
+                    opponents.add(_pair_key(a, b, n))
+            matches.append((slot, tuple(team_a), tuple(team_b)))
+        schedule.append(matches)
+
+    return schedule
 
-    db.execute(
-        "UPDATE tournament_meta SET generated_at_utc = ? WHERE tournament_id = ?",
-        (utc_now().isoformat(), t["id"])
-    )
-    db.commit()
 
+@app.post("/admin/<code>/generate")
+def generate_tournament(code):
+    t, meta = get_tournament(code, fresh=True)
+    if not t:
+        abort(404)
+    key = request.form.get("idempotency_key", "")[:64]
+    if meta and meta["generated_at_utc"]:
+        if key and key != meta["generation_key"]:
+            # Not a retry: someone else generated it since this form loaded.
+            return render_page(
+                "message.html",
+                title=f"Admin: {t['name']}",
+                subtitle="This tournament was already generated.",
+                back_url=url_for("tournament_view", code=code.upper()),
+                back_label="View Tournament",
+            )
+        return redirect(url_for("tournament_view", code=code.upper()))
+
+    # A double-click in this worker waits for the first submission instead
+    # of queueing on the write lock behind it.
+    first = key and generation_in_flight.start(key)
+    if key and not first:
+        generation_in_flight.wait(key)
+        return redirect(url_for("tournament_view", code=code.upper()))
+    try:
+        outcome = build_tournament(t, key)
+    finally:
+        if key:
+            generation_in_flight.finish(key)
+    if outcome is not None:
+        subtitle, strong, message = outcome
+        return render_page(
+            "message.html",
+            title=f"Admin: {t['name']}",
+            subtitle=subtitle,
+            tone="closed",
+            strong=strong,
+            message=message,
+            back_url=url_for("admin_tournament", code=code),
+        )
     return redirect(url_for("tournament_view", code=code.upper()))
 
 
+def build_tournament(t, key):
+    # Claims and builds the schedule in one write transaction. Concurrent
+    # submissions queue on the lock and find the tournament already
+    # generated, so matches are never wiped or built twice. Returns None
+    # when generated (now or earlier), else (subtitle, strong, message) for
+    # the admin; the claim is rolled back then, so they can try again.
+    db = get_db()
+    with write_transaction(db):
+        db.execute(QUERIES["ensure_meta"], (t["id"],))
+        if not db.execute(QUERIES["claim_generation"], (utc_now().isoformat(), key or None, t["id"])).rowcount:
+            return None
+        players = db.execute(QUERIES["scheduling_roster"], (t["id"],)).fetchall()
+        if len(players) < 6:
+            db.rollback()
+            return (
+                "Not enough players yet.",
+                "Need at least 6 players",
+                f"to generate a 3v3 tournament. Currently: {len(players)}",
+            )
+
+        meta = db.execute(QUERIES["meta"], (t["id"],)).fetchone()
+        rounds = int(meta["rounds"])
+        game_types = [x.strip() for x in meta["game_types"].split(",") if x.strip()]
+        if not game_types:
+            game_types = ["Type A", "Type B", "Type C"]
+
+        gamertags = [p["gamertag"] for p in players]
+        # Rows whose text predates validation have a 0 mask; treat them as
+        # available everywhere rather than never scheduling them.
+        masks = [p["availability_mask"] or ALL_SLOTS for p in players]
+        # A round only comes out empty when no slot has six free players;
+        # drop such rounds so the bracket has no blank ones.
+        schedule = [round_matches for round_matches in build_schedule(masks, rounds) if round_matches]
+        if not schedule:
+            db.rollback()
+            return (
+                "Not enough overlapping availability.",
+                "No slot where six players overlap",
+                f"among the {len(players)} registered. Matches need all six players free at the same time.",
+            )
+        rounds = len(schedule)
+        rows = []
+        for r, round_matches in enumerate(schedule, 1):
+            game_type = game_types[(r - 1) % len(game_types)]
+            for slot, team_a, team_b in round_matches:
+                rows.append((
+                    t["id"], r, game_type,
+                    ",".join(gamertags[i] for i in team_a),
+                    ",".join(gamertags[i] for i in team_b),
+                    slot,
+                ))
+        db.execute(QUERIES["delete_matches"], (t["id"],))
+        db.executemany(QUERIES["insert_match"], rows)
+        db.execute(QUERIES["delete_standings"], (t["id"],))
+        scheduled = {gamertag for row in rows for team in row[3:5] for gamertag in team_members(team)}
+        db.executemany(QUERIES["standings_add"], ((t["id"], gamertag, 0, 0, 0) for gamertag in scheduled))
+        bump_version(db, t["id"])
+        record_event(db, t["id"], "tournament_generated", {"rounds": rounds, "matches": len(rows)})
+    tournament_cache.invalidate(t["code"])
+    # Meta and every match changed; reloading is simpler than patching.
+    hot_store.invalidate(t["id"])
+    return None
+
+
+class InFlight:
+    # Keys of requests being handled by this worker process.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events = {}
+
+    def start(self, key) -> bool:
+        # True if the caller is first and must call finish(key).
+        with self._lock:
+            if key in self._events:
+                return False
+            self._events[key] = threading.Event()
+            return True
+
+    def wait(self, key, timeout=30):
+        with self._lock:
+            event = self._events.get(key)
+        if event:
+            event.wait(timeout)
+
+    def finish(self, key):
+        with self._lock:
+            self._events.pop(key).set()
+
+
+generation_in_flight = InFlight()
+
+
 @app.get("/t/<code>")
 def tournament_view(code):
-    db = get_db()
-    t = db.execute("SELECT * FROM tournaments WHERE code = ?", (code.upper(),)).fetchone()
-    if not t:
-        abort(404)
+    frozen = serve_frozen(code, "results")
+    if frozen:
+        return frozen
+    state = tournament_state(code, required=False)
+    if state is None:
+        return archived_tournament_view(code)
+    t, meta, version, changed_at, events_after, hot = state
+    generated = bool(meta and meta["generated_at_utc"])
+    final = bool(meta and meta["finalized_at_utc"])
+
+    def build():
+        events_url = None if final else url_for("tournament_events", code=t["code"], after=events_after)
+        if not generated:
+            return render_page(
+                "message.html",
+                title=f"Tournament: {t['name']}",
+                subtitle="Tournament not generated yet.",
+                back_url=url_for("admin_tournament", code=code),
+                back_label="Go to Admin",
+                awaiting_generation=True,
+                events_url=events_url,
+            )
+
+        def build_matches():
+            matches = hot.matches if hot else get_db().execute(QUERIES["matches"], (t["id"],)).fetchall()
+            return render_template("_matches.html", code=t["code"], matches=matches, readonly=final)
 
-    meta = db.execute("SELECT * FROM tournament_meta WHERE tournament_id = ?", (t["id"],)).fetchone()
-    if not meta or not meta["generated_at_utc"]:
         return render_page(
-            f"Tournament: {t['name']}",
-            "Tournament not generated yet.",
-            f"<p><a href='{url_for('admin_tournament', code=code)}'>Go to Admin</a></p>"
+            "tournament.html",
+            title=f"Tournament: {t['name']}",
+            subtitle="Final results." if final else "Rounds generated. Record match winners below.",
+            code=code,
+            match_list=cached_fragment((t["id"], version, "matches"), build_matches),
+            events_url=events_url,
         )
 
-    matches = db.execute(
-        "SELECT * FROM matches WHERE tournament_id = ? ORDER BY round_num ASC",
-        (t["id"],)
-    ).fetchall()
-
-    def fmt_team(s):
-        return " vs ".join([x.strip() for x in s.split(",")])
-
-    rows = ""
-    for m in matches:
-        winner = m["winner"] or "—"
-        rows += f"""
-          <div>
-            <b>Round {m['round_num']}</b> <span class="muted">({m['game_type']})</span><br>
-            <span class="muted">Team A:</span> {fmt_team(m['team_a'])}<br>
-            <span class="muted">Team B:</span> {fmt_team(m['team_b'])}<br>
-            <span class="muted">Winner:</span> <b>{winner}</b>
-            <form method="post" action="{url_for('set_winner', code=code, match_id=m['id'])}" style="margin-top:8px;">
-              <select name="winner" required>
-                <option value="">Set winner…</option>
-                <option value="A">Team A</option>
-                <option value="B">Team B</option>
-              </select>
-              <button type="submit">Save Winner</button>
-            </form>
-          </div>
-          <div class="hr"></div>
-        """
-
-    return render_page(
-        f"Tournament: {t['name']}",
-        "Rounds generated. Record match winners below.",
-        f"""
-        <p><a href="{url_for('admin_tournament', code=code)}">Back to Admin</a></p>
-        <div class="hr"></div>
-        {rows}
-        """
-    )
+    if final:
+        frozen = freeze_page(code, "results", t["id"], version, build)
+        if frozen:
+            return frozen
+    # The meta row comes from tournament_cache, so `generated` is part of the
+    # ETag: a worker that briefly served a stale page cannot pin it with a 304.
+    return conditional_page(f"t-{t['id']}-{version}-{int(generated)}-{int(final)}", changed_at, build)
 
 
 @app.post("/t/<code>/match/<int:match_id>/winner")
@@ -686,100 +2066,1232 @@ def set_winner(code, match_id):
     if winner not in ("A", "B"):
         abort(400)
 
+    t, _ = get_tournament(code)
+    if not t:
+        abort(404)
+
     db = get_db()
-    t = db.execute("SELECT * FROM tournaments WHERE code = ?", (code.upper(),)).fetchone()
+    # Take the write lock before reading the current winner, so two
+    # submissions for the same match cannot both apply their standings
+    # change against the same old result.
+    with write_transaction(db):
+        ensure_not_finalized(db, t["id"])
+        match = db.execute(QUERIES["match_result"], (match_id, t["id"])).fetchone()
+        changed = match and match["winner"] != winner
+        if changed:
+            db.execute(QUERIES["set_winner"], (winner, match_id, t["id"]))
+            update_standings(db, t["id"], [(match["team_a"], match["team_b"], match["winner"], winner)])
+            version = bump_version(db, t["id"])
+            event_id = record_event(db, t["id"], "winner_set", {"id": match_id, "w": winner})
+    if changed:
+        hot_store.write_through(t["id"], version, event_id, lambda state: state.set_winners([(winner, match_id)]))
+
+    return redirect(url_for("tournament_view", code=code.upper()))
+
+
+@app.post("/t/<code>/winners")
+def set_winners(code):
+    # Bulk form on /t/<code>: one winner-<match id> field per match, left
+    # blank for matches without a new result.
+    submitted = {}
+    for field, value in request.form.items():
+        if not field.startswith("winner-") or not value.strip():
+            continue
+        try:
+            match_id = int(field.removeprefix("winner-"))
+        except ValueError:
+            abort(400)
+        winner = value.strip().upper()
+        if winner not in ("A", "B"):
+            abort(400)
+        submitted[match_id] = winner
+
+    t, _ = get_tournament(code)
     if not t:
         abort(404)
 
-    db.execute(
-        "UPDATE matches SET winner = ? WHERE id = ? AND tournament_id = ?",
-        (winner, match_id, t["id"])
-    )
-    db.commit()
+    if submitted:
+        db = get_db()
+        with write_transaction(db):
+            ensure_not_finalized(db, t["id"])
+            results, updates = [], []
+            for match_id, winner in submitted.items():
+                match = db.execute(QUERIES["match_result"], (match_id, t["id"])).fetchone()
+                if not match:
+                    abort(400, f"Match {match_id} is not part of this tournament.")
+                if match["winner"] != winner:
+                    results.append((match["team_a"], match["team_b"], match["winner"], winner))
+                    updates.append((winner, match_id, t["id"]))
+            if updates:
+                db.executemany(QUERIES["set_winner"], updates)
+                update_standings(db, t["id"], results)
+                version = bump_version(db, t["id"])
+                for winner, match_id, _ in updates:
+                    event_id = record_event(db, t["id"], "winner_set", {"id": match_id, "w": winner})
+        if updates:
+            hot_store.write_through(
+                t["id"], version, event_id, lambda state: state.set_winners((w, m) for w, m, _ in updates)
+            )
 
     return redirect(url_for("tournament_view", code=code.upper()))
 
 
+# -----------------------
+# Standings
+# -----------------------
+# One row per scheduled player, seeded by generate_tournament and adjusted
+# by set_winner in the same transaction as the match update.
+def team_members(team) -> list:
+    return [gamertag.strip() for gamertag in team.split(",")]
+
+
+def standings_deltas(results) -> dict:
+    # results: (team_a, team_b, old winner, new winner) per changed match.
+    # Returns {gamertag: [wins, losses, played]} to add; changing A -> B
+    # takes the old result back out before counting the new one.
+    deltas = {}
+    for team_a, team_b, old, new in results:
+        for winner, sign in ((old, -1), (new, 1)):
+            if winner not in ("A", "B"):
+                continue
+            winners, losers = (team_a, team_b) if winner == "A" else (team_b, team_a)
+            for gamertag in team_members(winners):
+                delta = deltas.setdefault(gamertag, [0, 0, 0])
+                delta[0] += sign
+                delta[2] += sign
+            for gamertag in team_members(losers):
+                delta = deltas.setdefault(gamertag, [0, 0, 0])
+                delta[1] += sign
+                delta[2] += sign
+    return deltas
+
+
+def update_standings(db, tournament_id, results):
+    # Call inside the transaction that updates matches.winner.
+    db.executemany(
+        QUERIES["standings_add"],
+        ((tournament_id, gamertag, *delta) for gamertag, delta in standings_deltas(results).items() if any(delta)),
+    )
+
+
+def tally_standings(db, tournament_id) -> dict:
+    # Recount from matches; what the standings table should contain.
+    matches = db.execute(QUERIES["matches"], (tournament_id,)).fetchall()
+    tally = {
+        gamertag: [0, 0, 0]
+        for m in matches
+        for gamertag in team_members(m["team_a"]) + team_members(m["team_b"])
+    }
+    results = ((m["team_a"], m["team_b"], None, m["winner"]) for m in matches)
+    tally.update(standings_deltas(results))
+    return tally
+
+
+@app.cli.command("rebuild-standings")
+@click.option("--check", is_flag=True, help="Only report drift; exit 1 if any.")
+def rebuild_standings_command(check):
+    db = sqlite3.connect(DATABASE, timeout=30, isolation_level=None)
+    db.row_factory = sqlite3.Row
+    drifted = 0
+    try:
+        with write_transaction(db):
+            for t in db.execute("SELECT id, code FROM tournaments ORDER BY id").fetchall():
+                expected = tally_standings(db, t["id"])
+                stored = {
+                    row["gamertag"]: [row["wins"], row["losses"], row["played"]]
+                    for row in db.execute(QUERIES["standings"], (t["id"],))
+                }
+                if stored == expected:
+                    continue
+                drifted += 1
+                for gamertag in sorted(stored.keys() | expected.keys()):
+                    if stored.get(gamertag) != expected.get(gamertag):
+                        print(
+                            f"{t['code']} {gamertag}: stored {stored.get(gamertag)}, "
+                            f"matches say {expected.get(gamertag)}"
+                        )
+                if not check:
+                    db.execute(QUERIES["delete_standings"], (t["id"],))
+                    db.executemany(
+                        QUERIES["standings_add"],
+                        ((t["id"], gamertag, *row) for gamertag, row in expected.items()),
+                    )
+                    bump_version(db, t["id"])
+    finally:
+        db.close()
+    print(f"{drifted} tournament(s) {'drifted' if check else 'rebuilt'}.")
+    if check and drifted:
+        raise SystemExit(1)
+
+
+@app.get("/t/<code>/standings")
+def standings_view(code):
+    t, _, version, changed_at, events_after, _ = tournament_state(code)
+
+    def build():
+        return render_page(
+            "standings.html",
+            title=f"Standings: {t['name']}",
+            subtitle="Wins, losses and games played across every recorded result.",
+            code=t["code"],
+            standings=get_db().execute(QUERIES["standings"], (t["id"],)).fetchall(),
+            events_url=url_for("tournament_events", code=t["code"], after=events_after),
+        )
+
+    return conditional_page(f"standings-{t['id']}-{version}", changed_at, build)
+
+
 # -----------------------
 # Admin
 # -----------------------
 @app.get("/admin/<code>")
 def admin_tournament(code):
+    t, meta, version, changed_at, _, hot = tournament_state(code)
+    open_now = registration_open(t)
+    generated = bool(meta and meta["generated_at_utc"])
+    finalized = bool(meta and meta["finalized_at_utc"])
+    slot = requested_slot()
+
+    def build():
+        return render_page(
+            "admin.html",
+            title=f"Admin: {t['name']}",
+            subtitle="Copy the join link and share it with players. Generate tournament when ready.",
+            code=code.upper(),
+            open_now=open_now,
+            deadline_text=fmt_dt(t["registration_deadline_utc"]),
+            generated=generated,
+            finalized=finalized,
+            # Lets generate_tournament recognise a resubmission of this form.
+            idempotency_key=secrets.token_urlsafe(16),
+            roster=roster_fragment(t, version, "roster_oldest", "admin_tournament", slot, hot),
+            slot=slot,
+            days=DAYS,
+            time_windows=TIME_WINDOWS,
+        )
+
+    return conditional_page(
+        f"admin-{t['id']}-{version}-{int(open_now)}-{int(generated)}-{int(finalized)}",
+        page_last_modified(t, changed_at, open_now),
+        build,
+    )
+
+
+@app.post("/admin/<code>/finalize")
+def finalize_tournament(code):
+    # Locks winners and the roster. The results page is frozen on its next
+    # view.
+    t, _ = get_tournament(code)
+    if not t:
+        abort(404)
+
     db = get_db()
-    t = db.execute("SELECT * FROM tournaments WHERE code = ?", (code.upper(),)).fetchone()
+    with write_transaction(db):
+        finalized = db.execute(QUERIES["finalize"], (utc_now().isoformat(), t["id"])).rowcount
+        if finalized:
+            bump_version(db, t["id"])
+            record_event(db, t["id"], "tournament_finalized", {})
+    if finalized:
+        tournament_cache.invalidate(code.upper())
+        hot_store.invalidate(t["id"])
+
+    return redirect(url_for("tournament_view", code=code.upper()))
+
+
+@app.get("/admin/<code>/roster")
+def admin_roster(code):
+    # Full roster for large lobbies, streamed row by row straight off the
+    # cursor instead of being built in memory.
+    t, _ = get_tournament(code)
     if not t:
         abort(404)
 
-    players = db.execute(
-        """
-        SELECT gamertag, availability_days, availability_window, availability_notes
-        FROM players
-        WHERE tournament_id = ?
-        ORDER BY created_at_utc ASC
-        """,
-        (t["id"],),
-    ).fetchall()
+    db = get_db()
+    total = db.execute(QUERIES["roster_count"], (t["id"],)).fetchone()[0]
+    players = db.execute(QUERIES["roster_all"], (t["id"],))
+    return app.response_class(
+        stream_template(
+            "roster.html",
+            title=f"Roster: {t['name']}",
+            subtitle=f"All {total} registered players, in signup order.",
+            code=t["code"],
+            players=players,
+        ),
+        mimetype="text/html",
+    )
 
-    join_link = url_for("join_page", code=code.upper(), _external=True)
-    tournament_link = url_for("tournament_view", code=code.upper(), _external=True)
-    deadline_text = fmt_dt(t["registration_deadline_utc"])
-    open_now = registration_open(t)
 
-    rows = ""
-    if players:
-        for p in players:
-            extras = f"{p['availability_days']} | {p['availability_window']} ET"
-            if p["availability_notes"]:
-                extras += f" | {p['availability_notes']}"
-            rows += f"<li><b>{p['gamertag']}</b> <span class='muted'>({extras})</span></li>"
+IMPORT_FIELDS = ("gamertag", "days", "window", "notes")
+IMPORT_DAY_SPLIT = re.compile(r"[,;/|\s]+")
+IMPORT_MAX_FORM_BYTES = 16 * 1024 * 1024
+
+
+def parse_import(text):
+    # Yields (line number, (gamertag, days, window, notes)) or
+    # (line number, error message) from CSV or JSON lines. CSV may start with
+    # a gamertag,days,window,notes header; days split on , ; / | or spaces.
+    lines = text.splitlines()
+    first = next((line for line in lines if line.strip()), "")
+    if first.lstrip().startswith("{"):
+        for line_no, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                yield line_no, "Not valid JSON."
+                continue
+            if not isinstance(item, dict):
+                yield line_no, "Expected a JSON object."
+                continue
+            days = item.get("days") or ""
+            if isinstance(days, str):
+                days = IMPORT_DAY_SPLIT.split(days)
+            elif not isinstance(days, list):
+                yield line_no, "days must be a string or a list."
+                continue
+            yield line_no, (
+                str(item.get("gamertag") or ""),
+                [str(d) for d in days],
+                str(item.get("window") or item.get("time_window") or ""),
+                str(item.get("notes") or ""),
+            )
+        return
+
+    reader = csv.reader(lines)
+    first_row = True
+    for fields in reader:
+        if not any(f.strip() for f in fields):
+            continue
+        if first_row:
+            first_row = False
+            if fields[0].strip().lower() == "gamertag":
+                continue
+        fields = (fields + [""] * len(IMPORT_FIELDS))[: len(IMPORT_FIELDS)]
+        yield reader.line_num, (fields[0], IMPORT_DAY_SPLIT.split(fields[1]), fields[2], fields[3])
+
+
+@app.post("/admin/<code>/import")
+def import_players(code):
+    # Rosters can be pasted into the form field; only this route accepts
+    # more than Flask's default 500 KB of form text.
+    request.max_form_memory_size = IMPORT_MAX_FORM_BYTES
+    t, _ = get_tournament(code)
+    if not t:
+        abort(404)
+
+    upload = request.files.get("file")
+    if upload and upload.filename:
+        text = upload.read().decode("utf-8-sig", errors="replace")
+    elif request.mimetype in ("text/csv", "text/plain", "application/x-ndjson", "application/jsonl"):
+        text = request.get_data(as_text=True)
     else:
-        rows = "<li>No players yet</li>"
+        text = request.form.get("rows", "")
+    if not text.strip():
+        abort(400, "Nothing to import.")
+
+    problems = []
+    rows = []
+    seen = set()
+    for line_no, parsed in parse_import(text):
+        if isinstance(parsed, str):
+            problems.append((line_no, "", parsed))
+            continue
+        values, error = clean_registration(*parsed)
+        if error:
+            problems.append((line_no, parsed[0].strip(), error))
+        elif values[0] in seen:
+            problems.append((line_no, values[0], "Duplicate gamertag earlier in this import."))
+        else:
+            seen.add(values[0])
+            rows.append((line_no, values))
+
+    # Holding the write lock while checking for existing gamertags means
+    # nothing can register between the check and the insert, so every
+    # UNIQUE(tournament_id, gamertag) conflict is reported, never raised.
+    db = get_db()
+    with write_transaction(db):
+        # The join page is frozen once registration closes.
+        if not accepting_registrations(db, t["id"]):
+            abort(409, "Registration is closed.")
+        existing = {r["gamertag"] for r in db.execute(QUERIES["gamertags"], (t["id"],))}
+        fresh = []
+        for line_no, values in rows:
+            if values[0] in existing:
+                problems.append((line_no, values[0], "Already registered."))
+            else:
+                fresh.append(values)
+        created = utc_now()
+        added = [(values, (created + timedelta(microseconds=i)).isoformat()) for i, values in enumerate(fresh)]
+        db.executemany(QUERIES["insert_player"], ((t["id"], *values, created_at) for values, created_at in added))
+        if fresh:
+            version = bump_version(db, t["id"])
+            # One summary event rather than one per row; listeners reload.
+            event_id = record_event(db, t["id"], "players_imported", {"count": len(fresh)})
+    if fresh:
+        hot_store.write_through(t["id"], version, event_id, lambda state: state.add_players(added))
+
+    problems.sort()
+    return render_page(
+        "import.html",
+        title=f"Import: {t['name']}",
+        subtitle=f"{len(fresh)} added, {len(problems)} skipped.",
+        code=t["code"],
+        added=len(fresh),
+        problems=problems,
+    )
+
+
+# -----------------------
+# JSON API
+# -----------------------
+# Read-only endpoints for bots and stream overlays: the same indexed queries
+# as the pages, no templates, short field names, keyset cursors and ETags.
+API_MAX_LIMIT = 1000
+
+
+def api_limit() -> int:
+    try:
+        limit = int(request.args.get("limit", ROSTER_PAGE_SIZE))
+    except ValueError:
+        abort(400, "limit must be an integer.")
+    return max(1, min(limit, API_MAX_LIMIT))
+
+
+def api_tournament(code):
+    t, meta = get_tournament(code)
+    if not t:
+        abort(404)
+    version, changed_at = tournament_version(t)
+    return t, meta, version, changed_at
+
 
-    meta = db.execute("SELECT * FROM tournament_meta WHERE tournament_id = ?", (t["id"],)).fetchone()
+@app.get("/api/t/<code>")
+def api_summary(code):
+    t, meta, version, changed_at = api_tournament(code)
+    open_now = registration_open(t)
     generated = bool(meta and meta["generated_at_utc"])
 
-    status_html = (
-        f"<div class='warning'><b>Registration OPEN</b><br>Closes at: <code>{deadline_text}</code></div>"
-        if open_now
-        else f"<div class='closed'><b>Registration CLOSED</b><br>Closed at: <code>{deadline_text}</code></div>"
+    def build():
+        return {
+            "code": t["code"],
+            "name": t["name"],
+            "open": open_now,
+            "deadline": t["registration_deadline_utc"],
+            "players": get_db().execute(QUERIES["roster_count"], (t["id"],)).fetchone()[0],
+            "generated": generated,
+            "v": version,
+        }
+
+    return conditional_page(
+        f"api-{t['id']}-{version}-{int(open_now)}-{int(generated)}",
+        page_last_modified(t, changed_at, open_now),
+        build,
     )
 
-    if generated:
-        gen_block = f"""
-        <div class="success">
-          <b>Tournament generated.</b><br>
-          Tournament page: <code>{tournament_link}</code>
-        </div>
-        """
-    else:
-        gen_block = f"""
-        <form method="post" action="{url_for('generate_tournament', code=code)}">
-          <button type="submit">Generate Tournament</button>
-        </form>
-        <p class="muted">Tournament page will appear here after generation.</p>
-        """
 
-    return render_page(
-        f"Admin: {t['name']}",
-        "Copy the join link and share it with players. Generate tournament when ready.",
-        f"""
-        {status_html}
+@app.get("/api/t/<code>/players")
+def api_players(code):
+    # Newest first, like the join page.
+    t, _, version, changed_at = api_tournament(code)
+    after = decode_cursor(request.args.get("after"), str, str)
+    limit = api_limit()
+
+    def build():
+        db = get_db()
+        if after:
+            rows = db.execute(QUERIES["roster_newest_after"], (t["id"], *after, limit + 1))
+        else:
+            rows = db.execute(QUERIES["roster_newest"], (t["id"], limit + 1))
+        players = rows.fetchall()
+        more = len(players) > limit
+        players = players[:limit]
+        return {
+            "items": [
+                {
+                    "g": p["gamertag"],
+                    "d": p["availability_days"],
+                    "w": p["availability_window"],
+                    "n": p["availability_notes"],
+                }
+                for p in players
+            ],
+            "next": roster_cursor(players[-1]) if more else None,
+            "v": version,
+        }
+
+    return conditional_page(f"api-players-{t['id']}-{version}", changed_at, build)
+
+
+@app.get("/api/t/<code>/matches")
+def api_matches(code):
+    t, meta, version, changed_at = api_tournament(code)
+    after = decode_cursor(request.args.get("after"), int, int)
+    limit = api_limit()
+
+    def build():
+        db = get_db()
+        if after:
+            rows = db.execute(QUERIES["matches_page_after"], (t["id"], *after, limit + 1))
+        else:
+            rows = db.execute(QUERIES["matches_page"], (t["id"], limit + 1))
+        matches = rows.fetchall()
+        more = len(matches) > limit
+        matches = matches[:limit]
+        return {
+            "items": [
+                {
+                    "id": m["id"],
+                    "r": m["round_num"],
+                    "t": m["game_type"],
+                    "s": m["slot"],
+                    "a": m["team_a"].split(","),
+                    "b": m["team_b"].split(","),
+                    "w": m["winner"],
+                }
+                for m in matches
+            ],
+            "next": encode_cursor(matches[-1]["round_num"], matches[-1]["id"]) if more else None,
+            "v": version,
+        }
+
+    return conditional_page(f"api-matches-{t['id']}-{version}", changed_at, build)
 
-        <div class="hr"></div>
 
-        <p><b>Join Link:</b></p>
-        <p><code>{join_link}</code></p>
+# -----------------------
+# Live event stream
+# -----------------------
+# GET /t/<code>/events is a Server-Sent Events stream of player_joined,
+# players_imported, tournament_generated and winner_set. One hub thread per
+# worker polls tournament_events on behalf of every listener; a listener
+# holds no database connection and just waits on its tournament's channel.
+# Under the gevent worker (see render.yaml) that is one greenlet per open
+# page, so thousands of idle viewers do not need thousands of workers.
+SSE_BATCH = 500
+SSE_RETRY_MS = 2000
+
+
+class EventChannel:
+    __slots__ = ("cond", "events", "floor", "listeners")
+
+    def __init__(self, lock, floor):
+        self.cond = threading.Condition(lock)
+        self.events = deque(maxlen=SSE_BUFFER)
+        # Events of this tournament with id <= floor are not in the buffer.
+        self.floor = floor
+        self.listeners = 0
+
+
+class EventHub:
+    def __init__(self, poll_interval):
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._channels = {}
+        self._last_id = 0
+        self.polls = 0
+        self.delivered = 0
+
+    def subscribe(self, tournament_id):
+        # Returns (channel, floor). Every event with id <= floor was committed
+        # before this call, so a backlog query made afterwards will see it.
+        self._start()
+        with self._lock:
+            channel = self._channels.get(tournament_id)
+            if channel is None:
+                channel = self._channels[tournament_id] = EventChannel(self._lock, self._last_id)
+            channel.listeners += 1
+            return channel, channel.floor
+
+    def unsubscribe(self, tournament_id, channel):
+        with self._lock:
+            channel.listeners -= 1
+            if not channel.listeners and self._channels.get(tournament_id) is channel:
+                del self._channels[tournament_id]
+
+    def wait(self, channel, after, timeout):
+        # Buffered (id, kind, data) newer than `after`, waiting up to timeout
+        # for the first one; None when some were dropped from the buffer.
+        with self._lock:
+            if not channel.events or channel.events[-1][0] <= after:
+                channel.cond.wait(timeout)
+            if after < channel.floor:
+                return None
+            return [event for event in channel.events if event[0] > after]
+
+    def _start(self):
+        start_per_process("event-hub", self._run, self._reset)
+
+    def _reset(self):
+        db = _open_connection(readonly=True)
+        with self._lock:
+            self._last_id = db.execute(QUERIES["latest_event"]).fetchone()[0] or 0
+            self._channels = {}
+        return (db,)
+
+    def _run(self, db):
+        seen = None
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                # data_version only moves when another connection commits, so
+                # a quiet database costs one pragma per poll.
+                version = db.execute("PRAGMA data_version").fetchone()[0]
+                if version == seen:
+                    continue
+                seen = version
+                self._poll(db)
+            except Exception:
+                app.logger.exception("Event hub poll failed")
+
+    def _poll(self, db):
+        while True:
+            rows = db.execute(QUERIES["new_events"], (self._last_id, SSE_BATCH)).fetchall()
+            if not rows:
+                return
+            with self._lock:
+                self.polls += 1
+                woken = set()
+                for row in rows:
+                    channel = self._channels.get(row["tournament_id"])
+                    if channel is None:
+                        continue
+                    if len(channel.events) == channel.events.maxlen:
+                        channel.floor = channel.events[0][0]
+                    channel.events.append((row["id"], row["kind"], row["data"]))
+                    woken.add(channel)
+                self._last_id = rows[-1]["id"]
+                for channel in woken:
+                    channel.cond.notify_all()
+                self.delivered += len(woken)
+            if len(rows) < SSE_BATCH:
+                return
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "channels": len(self._channels),
+                "listeners": sum(c.listeners for c in self._channels.values()),
+                "last_id": self._last_id,
+                "polls": self.polls,
+                "delivered": self.delivered,
+            }
+
+
+event_hub = EventHub(SSE_POLL_SECONDS)
+
+
+def sse_message(event_id, kind, data) -> str:
+    return f"id: {event_id}\nevent: {kind}\ndata: {data}\n\n"
+
+
+def event_stream(tournament_id, after):
+    channel, floor = event_hub.subscribe(tournament_id)
+    try:
+        db = checkout_connection(readonly=True)
+        try:
+            backlog = db.execute(QUERIES["events_after"], (tournament_id, after, SSE_BUFFER + 1)).fetchall()
+            first = db.execute(QUERIES["first_event"]).fetchone()[0]
+        finally:
+            checkin_connection(db)
+
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        # Too far behind to replay (or older than the pruned log): tell the
+        # page to reload itself instead.
+        if len(backlog) > SSE_BUFFER or (first and 0 < after < first - 1):
+            yield "event: reset\ndata: {}\n\n"
+            return
+        for row in backlog:
+            yield sse_message(row["id"], row["kind"], row["data"])
+            after = row["id"]
+        after = max(after, floor)
+
+        # Streams end after SSE_MAX_STREAM_SECONDS; EventSource reconnects on
+        # its own and resumes from Last-Event-ID.
+        deadline = time.monotonic() + SSE_MAX_STREAM_SECONDS
+        while (remaining := deadline - time.monotonic()) > 0:
+            events = event_hub.wait(channel, after, min(SSE_HEARTBEAT_SECONDS, remaining))
+            if events is None:
+                yield "event: reset\ndata: {}\n\n"
+                return
+            if not events:
+                # Comment line: keeps proxies from timing out the connection
+                # and surfaces disconnected clients.
+                yield ": ping\n\n"
+                continue
+            for event_id, kind, data in events:
+                yield sse_message(event_id, kind, data)
+                after = event_id
+    finally:
+        event_hub.unsubscribe(tournament_id, channel)
+
+
+@app.get("/t/<code>/events")
+def tournament_events(code):
+    t, _ = get_tournament(code)
+    if not t:
+        abort(404)
+    try:
+        after = int(request.headers.get("Last-Event-ID") or request.args.get("after") or 0)
+    except ValueError:
+        abort(400, "Invalid event id.")
 
-        <div class="hr"></div>
+    response = app.response_class(event_stream(t["id"], after), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
 
-        {gen_block}
 
-        <div class="hr"></div>
+# -----------------------
+# Retention
+# -----------------------
+# Tournaments whose registration closed more than ARCHIVE_AFTER_DAYS ago are
+# packed into tournament_archive and deleted from the live tables, so those
+# tables and their indexes only hold recent events. Freed pages are handed
+# back to the disk with incremental VACUUM. Run by `flask archive`, and in
+# the background every ARCHIVE_EVERY_HOURS when that is set.
+ARCHIVE_BATCH = 50
+VACUUM_STEP_PAGES = 2000
+
+
+def maintenance_connection():
+    db = sqlite3.connect(DATABASE, timeout=30, isolation_level=None)
+    db.row_factory = sqlite3.Row
+    db.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+    db.execute("PRAGMA foreign_keys = ON")
+    return db
+
+
+def archive_tournament(db, tournament_id):
+    # Call inside a write transaction. Returns the archived code, if any.
+    t = db.execute(QUERIES["tournament_by_id"], (tournament_id,)).fetchone()
+    if not t:
+        return None
+    meta = db.execute(QUERIES["meta"], (tournament_id,)).fetchone()
+    data = {
+        "t": dict(t),
+        "meta": dict(meta) if meta else None,
+        "players": [list(p) for p in db.execute(QUERIES["hot_roster"], (tournament_id,))],
+        "matches": [
+            [m["id"], m["round_num"], m["game_type"], m["team_a"], m["team_b"], m["winner"], m["slot"]]
+            for m in db.execute(QUERIES["matches"], (tournament_id,))
+        ],
+        "standings": [list(row) for row in db.execute(QUERIES["standings"], (tournament_id,))],
+    }
+    blob = zlib.compress(json.dumps(data, separators=(",", ":")).encode(), 9)
+    db.execute(QUERIES["insert_archive"], (tournament_id, t["code"], utc_now().isoformat(), blob))
+    db.execute(QUERIES["delete_tournament"], (tournament_id,))
+    return t["code"]
+
+
+def run_retention(db, max_age_days=ARCHIVE_AFTER_DAYS) -> dict:
+    # db is an autocommit connection (maintenance_connection). Archives in
+    # batches of ARCHIVE_BATCH per transaction, then vacuums in steps of
+    # VACUUM_STEP_PAGES, so the write lock is never held for long.
+    cutoff = (utc_now() - timedelta(days=max_age_days)).isoformat()
+    archived = 0
+    while True:
+        with write_transaction(db):
+            ids = [row[0] for row in db.execute(QUERIES["archive_candidates"], (cutoff, ARCHIVE_BATCH))]
+            codes = [code for code in (archive_tournament(db, i) for i in ids) if code]
+        archived += len(codes)
+        for code in codes:
+            unfreeze(code)
+        if len(ids) < ARCHIVE_BATCH:
+            break
+
+    freed = 0
+    if db.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        while (free := db.execute("PRAGMA freelist_count").fetchone()[0]) > 0:
+            step = min(free, VACUUM_STEP_PAGES)
+            db.execute(f"PRAGMA incremental_vacuum({step})").fetchall()
+            freed += step
+    return {"archived": archived, "freed_pages": freed}
+
+
+@app.cli.command("archive")
+@click.option("--days", type=float, default=ARCHIVE_AFTER_DAYS, show_default=True,
+              help="Archive tournaments whose registration closed this many days ago.")
+def archive_command(days):
+    db = maintenance_connection()
+    try:
+        if db.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            # One-time switch; afterwards space is reclaimed incrementally.
+            print("Enabling incremental auto_vacuum (one full VACUUM)...")
+            db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            db.execute("VACUUM")
+        result = run_retention(db, days)
+        page_size = db.execute("PRAGMA page_size").fetchone()[0]
+        pages = db.execute("PRAGMA page_count").fetchone()[0]
+    finally:
+        db.close()
+    print(
+        f"Archived {result['archived']} tournament(s), freed {result['freed_pages']} page(s); "
+        f"database is {pages * page_size / 1024 / 1024:.1f} MiB."
+    )
 
-        <h3>Registered Players ({len(players)})</h3>
-        <ul>{rows}</ul>
-        """
+
+def _retention_loop():
+    db = maintenance_connection()
+    while True:
+        # Spread workers out so they do not all wake at once.
+        time.sleep(ARCHIVE_EVERY_HOURS * 3600 * (1 + random.random() / 10))
+        try:
+            result = run_retention(db)
+            if result["archived"]:
+                app.logger.info("Retention: %s", result)
+        except Exception:
+            app.logger.exception("Retention run failed")
+
+
+if ARCHIVE_EVERY_HOURS > 0:
+    @app.before_request
+    def start_retention():
+        start_per_process("retention", _retention_loop)
+
+
+def archived_tournament_view(code):
+    # Read-only /t/<code> for an archived tournament, rendered from its
+    # archive document. It never changes again, so it may be cached.
+    row = get_db().execute(QUERIES["archived_by_code"], (code.upper(),)).fetchone()
+    if not row:
+        abort(404)
+
+    def build():
+        data = json.loads(zlib.decompress(row["data"]))
+        t = data["t"]
+        matches = [HotMatch(*m) for m in data["matches"]]
+        archived_at = fmt_dt(row["archived_at_utc"])
+        if not matches:
+            return render_page(
+                "message.html",
+                title=f"Tournament: {t['name']}",
+                subtitle=f"Archived {archived_at} without being generated.",
+            )
+        return render_page(
+            "tournament.html",
+            title=f"Tournament: {t['name']}",
+            subtitle=f"Final results, archived {archived_at}.",
+            code=t["code"],
+            archived=True,
+            match_list=Markup(render_template("_matches.html", code=t["code"], matches=matches, readonly=True)),
+        )
+
+    response = conditional_page(
+        f"archive-{row['tournament_id']}", datetime.fromisoformat(row["archived_at_utc"]), build
     )
+    response.cache_control.no_cache = None
+    response.cache_control.public = True
+    response.cache_control.max_age = 86400
+    return response
+
+
+# -----------------------
+# Instrumentation
+# -----------------------
+# Off unless METRICS=1 (Prometheus text on /metrics) or SLOW_REQUEST_MS > 0
+# (log requests slower than that, with their SQL). When both are off no
+# hooks are registered and get_db hands out plain pooled connections.
+# Metrics are per worker process; each scrape reads whichever worker
+# answers.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (512, 2048, 8192, 32768, 131072, 524288, 2097152)
+
+
+class RequestTrace:
+    __slots__ = ("start", "sql_count", "sql_seconds", "statements", "render_seconds", "render_stack")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.statements = [] if SLOW_REQUEST_MS > 0 else None
+        self.render_seconds = 0.0
+        self.render_stack = []
+
+    def add_sql(self, sql, seconds):
+        self.sql_count += 1
+        self.sql_seconds += seconds
+        if self.statements is not None:
+            self.statements.append((" ".join(sql.split()), seconds))
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f"{name}_sum{{{labels}}} {self.total}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+class RequestMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.responses = {}
+        self.latency = {}
+        self.size = {}
+        self.sql_count = {}
+        self.sql_seconds = {}
+        self.render_seconds = {}
+
+    def observe(self, endpoint, method, status, trace, seconds, size):
+        with self._lock:
+            key = (endpoint, method, status)
+            self.responses[key] = self.responses.get(key, 0) + 1
+            if endpoint not in self.latency:
+                self.latency[endpoint] = Histogram(LATENCY_BUCKETS)
+                self.size[endpoint] = Histogram(SIZE_BUCKETS)
+            self.latency[endpoint].observe(seconds)
+            if size is not None:
+                self.size[endpoint].observe(size)
+            self.sql_count[endpoint] = self.sql_count.get(endpoint, 0) + trace.sql_count
+            self.sql_seconds[endpoint] = self.sql_seconds.get(endpoint, 0.0) + trace.sql_seconds
+            self.render_seconds[endpoint] = self.render_seconds.get(endpoint, 0.0) + trace.render_seconds
+
+    def exposition(self) -> str:
+        out = []
+
+        def family(name, kind, help_text):
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            family("http_responses_total", "counter", "Responses by endpoint, method and status.")
+            for (endpoint, method, status), n in sorted(self.responses.items()):
+                out.append(f'http_responses_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {n}')
+            family("http_request_duration_seconds", "histogram", "Time spent handling the request.")
+            for endpoint, hist in sorted(self.latency.items()):
+                out.extend(hist.lines("http_request_duration_seconds", f'endpoint="{endpoint}"'))
+            family("http_response_size_bytes", "histogram", "Response body size, when known up front.")
+            for endpoint, hist in sorted(self.size.items()):
+                out.extend(hist.lines("http_response_size_bytes", f'endpoint="{endpoint}"'))
+            for name, values, help_text in (
+                ("db_statements_total", self.sql_count, "SQL statements executed."),
+                ("db_statement_seconds_total", self.sql_seconds, "Time spent executing SQL statements."),
+                ("template_render_seconds_total", self.render_seconds, "Time spent rendering templates."),
+            ):
+                family(name, "counter", help_text)
+                for endpoint, value in sorted(values.items()):
+                    out.append(f'{name}{{endpoint="{endpoint}"}} {value}')
+
+        for prefix, stats in (
+            ("db_pool", pool_stats()),
+            ("tournament_cache", tournament_cache.stats()),
+            ("fragment_cache", fragment_cache.stats()),
+            ("compressed_cache", compressed_cache.stats()),
+            ("events", event_hub.stats()),
+            ("hot_state", hot_store.stats()),
+            ("admission", admission.stats()),
+        ):
+            for key, value in stats.items():
+                family(f"{prefix}_{key}", "gauge", f"{prefix} {key}.")
+                out.append(f"{prefix}_{key} {int(value) if isinstance(value, bool) else value}")
+        family("schema_init_seconds", "gauge", "Time init_db took when this worker started.")
+        out.append(f"schema_init_seconds {SCHEMA_INIT_SECONDS}")
+        return "\n".join(out) + "\n"
+
+
+request_metrics = RequestMetrics()
+
+
+def _render_started(sender, template, context, **extra):
+    trace = g.get("trace")
+    if trace is not None:
+        trace.render_stack.append(time.perf_counter())
+
+
+def _render_finished(sender, template, context, **extra):
+    trace = g.get("trace")
+    if trace is not None and trace.render_stack:
+        started = trace.render_stack.pop()
+        # Only the outermost template counts; includes are part of it.
+        if not trace.render_stack:
+            trace.render_seconds += time.perf_counter() - started
+
+
+def start_trace():
+    g.trace = RequestTrace()
+
+
+def finish_trace(response):
+    trace = g.pop("trace", None)
+    if trace is None:
+        return response
+    seconds = time.perf_counter() - trace.start
+    endpoint = request.url_rule.endpoint if request.url_rule else "unmatched"
+    if METRICS:
+        request_metrics.observe(
+            endpoint, request.method, response.status_code, trace, seconds, response.content_length
+        )
+    if SLOW_REQUEST_MS > 0 and seconds * 1000 >= SLOW_REQUEST_MS:
+        app.logger.warning(
+            "Slow request: %s %s -> %s in %.1f ms (%d SQL, %.1f ms; render %.1f ms)%s",
+            request.method, request.full_path.rstrip("?"), response.status_code, seconds * 1000,
+            trace.sql_count, trace.sql_seconds * 1000, trace.render_seconds * 1000,
+            "".join(f"\n  {took * 1000:8.2f} ms  {sql}" for sql, took in trace.statements),
+        )
+    return response
+
+
+if METRICS or SLOW_REQUEST_MS > 0:
+    app.before_request(start_trace)
+    app.after_request(finish_trace)
+    before_render_template.connect(_render_started, app)
+    template_rendered.connect(_render_finished, app)
+
+
+# -----------------------
+# Admission control
+# -----------------------
+# Opt-in with ADMISSION_CONTROL=1. Runs before the view, so a turned-away
+# request costs no database work:
+#   * join_submit and generate_tournament draw from a token bucket per client
+#     IP and one per tournament code (429 when either is empty);
+#   * every POST needs one of ADMISSION_MAX_WRITES write slots, waiting at
+#     most ADMISSION_WRITE_WAIT_MS for one (503 otherwise).
+# Both answers carry Retry-After. State is per worker process.
+ADMISSION_BUCKET_KEYS = 10000
+RATE_LIMITED_ENDPOINTS = {"join_submit", "generate_tournament"}
+
+
+class TokenBuckets:
+    # rate tokens per second up to burst, per key. Idle keys are dropped
+    # LRU-first past maxkeys; a dropped key comes back with a full bucket.
+
+    def __init__(self, rate, burst, maxkeys=ADMISSION_BUCKET_KEYS):
+        self.rate = rate
+        self.burst = burst
+        self.maxkeys = maxkeys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key) -> float:
+        # 0 if a token was taken, else seconds until one is available.
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.maxkeys:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class AdmissionControl:
+    def __init__(self):
+        self.by_ip = TokenBuckets(ADMISSION_IP_PER_MINUTE / 60, ADMISSION_IP_BURST)
+        self.by_code = TokenBuckets(ADMISSION_CODE_PER_SECOND, ADMISSION_CODE_BURST)
+        self.writes = threading.BoundedSemaphore(ADMISSION_MAX_WRITES)
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.limited_ip = 0
+        self.limited_code = 0
+        self.busy = 0
+        self.in_flight = 0
+
+    def _count(self, name, delta=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + delta)
+
+    def admit(self):
+        if request.method != "POST":
+            return None
+        if request.endpoint in RATE_LIMITED_ENDPOINTS:
+            wait = self.by_ip.take(client_ip())
+            if wait:
+                self._count("limited_ip")
+                return admission_response(429, wait, "Too many requests from your address.")
+            code = (request.view_args or {}).get("code", "").upper()
+            wait = self.by_code.take(code)
+            if wait:
+                self._count("limited_code")
+                return admission_response(429, wait, "This tournament is busy.")
+        if not self.writes.acquire(timeout=ADMISSION_WRITE_WAIT_MS / 1000):
+            self._count("busy")
+            return admission_response(503, 1, "Server is busy.")
+        g.write_slot = True
+        self._count("admitted")
+        self._count("in_flight")
+        return None
+
+    def release(self, exc=None):
+        if g.pop("write_slot", False):
+            self._count("in_flight", -1)
+            self.writes.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": ADMISSION_CONTROL,
+                "admitted": self.admitted,
+                "limited_ip": self.limited_ip,
+                "limited_code": self.limited_code,
+                "busy": self.busy,
+                "in_flight": self.in_flight,
+                "ip_keys": len(self.by_ip),
+                "code_keys": len(self.by_code),
+            }
+
+
+def client_ip():
+    # With ADMISSION_PROXY_HOPS trusted proxies in front, each appends the
+    # address it saw to X-Forwarded-For; the outermost one saw the client.
+    # Entries further left are whatever the client sent.
+    global _warned_proxy_hops
+    if "X-Forwarded-For" in request.headers:
+        if ADMISSION_PROXY_HOPS:
+            route = request.access_route
+            if len(route) >= ADMISSION_PROXY_HOPS:
+                return route[-ADMISSION_PROXY_HOPS]
+        elif not _warned_proxy_hops:
+            _warned_proxy_hops = True
+            app.logger.warning(
+                "Requests arrive through a proxy but ADMISSION_PROXY_HOPS is 0: every client "
+                "shares the proxy's per-IP bucket. Set it to the number of proxies in front."
+            )
+    return request.remote_addr or ""
+
+
+_warned_proxy_hops = False
+
+
+def admission_response(status, retry_after, message):
+    response = app.response_class(message + "\n", status=status, mimetype="text/plain")
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+admission = AdmissionControl()
+if ADMISSION_CONTROL:
+    app.before_request(admission.admit)
+    app.teardown_request(admission.release)
+
+
+# -----------------------
+# Response compression
+# -----------------------
+# On unless COMPRESSION=0. Text bodies of COMPRESS_MIN_BYTES or more are
+# sent as brotli (when the module is installed) or gzip, whichever the
+# client accepts. Versioned pages (those with an ETag) keep their compressed
+# bytes in compressed_cache, so a closed roster or a generated bracket is
+# compressed once per worker rather than once per view. Streams, files and
+# frozen pages (already gzip) pass through untouched.
+COMPRESSIBLE_TYPES = {"text/html", "text/plain", "text/css", "application/json"}
+# Their body is fully determined by URL and ETag; the admin page is not
+# (it carries a fresh idempotency key).
+COMPRESS_CACHE_ENDPOINTS = {
+    "join_page", "tournament_view", "standings_view",
+    "api_summary", "api_players", "api_matches", "theme_css",
+}
+compressed_cache = TTLCache(COMPRESS_CACHE_SIZE, FRAGMENT_CACHE_TTL)
+
+
+def compress(body, encoding) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, 6, mtime=0)
+
+
+def compress_response(response):
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_TYPES
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        encoding = "br"
+    elif accepted["gzip"]:
+        encoding = "gzip"
+    else:
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+
+    etag, _ = response.get_etag()
+    key = None
+    data = None
+    if etag and request.endpoint in COMPRESS_CACHE_ENDPOINTS:
+        key = (request.full_path, etag, encoding)
+        data = compressed_cache.get(key)
+    if data is None:
+        data = compress(body, encoding)
+        if key:
+            compressed_cache.put(key, data)
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    if etag:
+        # Same content, different bytes: a weak validator still matches
+        # the If-None-Match the client sends back.
+        response.set_etag(etag, weak=True)
+    return response
+
+
+if COMPRESSION:
+    app.after_request(compress_response)
+
+
+# -----------------------
+# Operations
+# -----------------------
+@app.get("/healthz")
+def healthz():
+    get_db().execute("SELECT 1").fetchone()
+    return {
+        "ok": True,
+        "db_pool": pool_stats(),
+        "tournament_cache": tournament_cache.stats(),
+        "fragment_cache": fragment_cache.stats(),
+        "compressed_cache": compressed_cache.stats(),
+        "group_commit": registration_writer.stats(),
+        "events": event_hub.stats(),
+        "hot_state": hot_store.stats(),
+        "admission": admission.stats(),
+    }
+
+
+@app.get("/metrics")
+def metrics():
+    if not METRICS:
+        abort(404)
+    return app.response_class(request_metrics.exposition(), mimetype="text/plain; version=0.0.4")
+
+
+# Schema setup runs once per worker at import time, never on the request path.
+_started = time.perf_counter()
+init_db()
+SCHEMA_INIT_SECONDS = time.perf_counter() - _started
 
 
 if __name__ == "__main__":
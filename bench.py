@@ -0,0 +1,569 @@
+"""Micro-benchmarks for app.py.
+
+    python bench.py render [--players 200] [--iterations 300]
+    python bench.py signups [--threads 32] [--requests 3000] [--group-commit]
+    python bench.py schedule [--players 1000] [--rounds 20] [--availability random|all]
+    python bench.py load [--target client|gunicorn] [--max-players 10000] [--requests 1000]
+                         [--output results.json] [--baseline baseline.json] [--save-baseline baseline.json]
+    python bench.py compression [--players 500] [--iterations 200]
+
+Each benchmark runs against a throwaway SQLite database unless DATABASE is
+already set in the environment.
+
+"load" seeds tournaments of up to --max-players players with generated
+matches, then drives every main route (through the Flask test client or a
+locally started gunicorn) and prints throughput and p50/p95/p99 latency per
+route as JSON. Baselines are machine-specific: save one on the machine that
+will run the comparison, then pass it with --baseline to exit non-zero when
+a route's p95 or throughput regresses by more than --tolerance.
+
+"compression" measures response bytes and process CPU per request for the
+main pages with MINIFY_HTML=0 COMPRESSION=0 (before) and with the defaults
+(after), each in a fresh interpreter since both are read at import.
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+
+def load_app():
+    if "DATABASE" not in os.environ:
+        os.environ["DATABASE"] = os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.db")
+    import app
+
+    return app
+
+
+def per_call_us(fn, iterations):
+    fn()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def seed_tournament(app, code, players, generate=True):
+    client = app.app.test_client()
+    client.post("/tournaments", data={"name": f"Bench {code}", "code": code})
+    with app.app.app_context():
+        db = app.get_db(readonly=False)
+        t = db.execute(app.QUERIES["tournament_by_code"], (code,)).fetchone()
+        now = app.utc_now()
+        rows = []
+        for i in range(players):
+            days = ",".join(app.DAYS[i % 7 : i % 7 + 3])
+            window = app.TIME_WINDOWS[i % len(app.TIME_WINDOWS)]
+            rows.append((
+                t["id"],
+                f"player{i:05d}",
+                days,
+                window,
+                "" if i % 3 else "Every other Wednesday",
+                app.availability_mask(days, window),
+                (now + app.timedelta(microseconds=i)).isoformat(),
+            ))
+        db.executemany(app.QUERIES["insert_player"], rows)
+        db.commit()
+    if generate:
+        client.post(f"/admin/{code}/generate")
+    return client
+
+
+def bench_render(args):
+    app = load_app()
+    seed_tournament(app, "BENCHRENDER", args.players)
+
+    with app.app.test_request_context("/"):
+        db = app.get_db()
+        t = db.execute(app.QUERIES["tournament_by_code"], ("BENCHRENDER",)).fetchone()
+        common = {"code": t["code"], "deadline_text": app.fmt_dt(t["registration_deadline_utc"])}
+        roster = db.execute(app.QUERIES["roster_newest"], (t["id"], app.ROSTER_PAGE_SIZE)).fetchall()
+        matches = db.execute(app.QUERIES["matches"], (t["id"],)).fetchall()
+        pages = {
+            "home.html": {"title": "Home", "subtitle": ""},
+            "_roster.html": {"players": roster, "total": args.players},
+            "_matches.html": {"code": t["code"], "matches": matches},
+            "join.html": dict(
+                common,
+                title="Join",
+                open_now=True,
+                roster=app.Markup(app.render_template("_roster.html", players=roster, total=args.players)),
+                days=app.DAYS,
+                time_windows=app.TIME_WINDOWS,
+            ),
+            "admin.html": dict(
+                common,
+                title="Admin",
+                open_now=True,
+                generated=True,
+                roster=app.Markup(app.render_template("_roster.html", players=roster, total=args.players)),
+                slot=None,
+                days=app.DAYS,
+                time_windows=app.TIME_WINDOWS,
+            ),
+            "tournament.html": dict(
+                common,
+                title="Tournament",
+                match_list=app.Markup(app.render_template("_matches.html", code=t["code"], matches=matches)),
+            ),
+            "message.html": {"title": "Error", "message": "That tournament code already exists."},
+        }
+
+        # "compiled" re-parses the page and base.html on every call, which is
+        # what render_template_string(BASE_HTML, ...) used to cost per request.
+        uncached = app.app.jinja_env.overlay(cache_size=0)
+        print(f"{'page':<18}{'compiled us':>14}{'cached us':>12}{'speedup':>10}")
+        for name, context in pages.items():
+            before = per_call_us(lambda: uncached.get_template(name).render(**context), args.iterations)
+            after = per_call_us(lambda: app.render_page(name, **context), args.iterations)
+            print(f"{name:<18}{before:>14.1f}{after:>12.1f}{before / after:>9.1f}x")
+
+
+def bench_signups(args):
+    app = load_app()
+    app.GROUP_COMMIT = args.group_commit
+    code = "BENCHSIGNUPS"
+    app.app.test_client().post("/tournaments", data={"name": "Bench signups", "code": code})
+
+    counter = itertools.count()
+    failures = []
+
+    def worker():
+        client = app.app.test_client()
+        while (i := next(counter)) < args.requests:
+            response = client.post(
+                f"/join/{code}",
+                data={"gamertag": f"player{i:06d}", "days": ["Mon", "Wed"], "time_window": "8pm-10pm"},
+            )
+            if response.status_code != 302:
+                failures.append(response.status_code)
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    mode = "group commit" if args.group_commit else "commit per request"
+    print(f"{mode}: {args.requests} signups from {args.threads} threads in {elapsed:.2f}s "
+          f"= {args.requests / elapsed:.0f}/s, {len(failures)} failures")
+    if args.group_commit:
+        print(app.registration_writer.stats())
+
+
+def bench_schedule(args):
+    app = load_app()
+    rng = random.Random(args.seed)
+    if args.availability == "all":
+        masks = [app.ALL_SLOTS] * args.players
+    else:
+        masks = [
+            app.availability_mask(
+                ",".join(rng.sample(app.DAYS, rng.randint(1, 4))), rng.choice(app.TIME_WINDOWS)
+            )
+            for _ in range(args.players)
+        ]
+    start = time.perf_counter()
+    schedule = app.build_schedule(masks, args.rounds, rng)
+    elapsed = time.perf_counter() - start
+
+    appearances = [0] * args.players
+    teammate_pairs, opponent_pairs = {}, {}
+    for round_matches in schedule:
+        for slot, team_a, team_b in round_matches:
+            assert all(masks[p] >> slot & 1 for p in team_a + team_b), "player seated outside availability"
+            for team in (team_a, team_b):
+                for a in team:
+                    appearances[a] += 1
+                for a, b in itertools.combinations(sorted(team), 2):
+                    teammate_pairs[a, b] = teammate_pairs.get((a, b), 0) + 1
+            for a in team_a:
+                for b in team_b:
+                    key = (min(a, b), max(a, b))
+                    opponent_pairs[key] = opponent_pairs.get(key, 0) + 1
+
+    print(f"{args.players} players x {args.rounds} rounds: {elapsed * 1000:.1f} ms, "
+          f"{sum(len(r) for r in schedule)} matches")
+    print(f"appearances min/max: {min(appearances)}/{max(appearances)}")
+    print(f"repeat teammate pairs: {sum(c - 1 for c in teammate_pairs.values())}, "
+          f"repeat opponent pairs: {sum(c - 1 for c in opponent_pairs.values())}")
+
+
+LOAD_ROUTES = (
+    "create_tournament", "join_page", "join_submit", "generate_tournament", "tournament_view", "set_winner",
+)
+OK_STATUSES = (200, 302, 304)
+
+
+class ClientTarget:
+    def __init__(self, app):
+        self.app = app
+
+    def session(self):
+        client = self.app.app.test_client()
+
+        def send(method, path, data=None):
+            return client.open(path, method=method, data=data).status_code
+
+        return send
+
+    def close(self):
+        pass
+
+
+class GunicornTarget:
+    def __init__(self, workers, worker_class):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        self.proc = subprocess.Popen(
+            [
+                sys.executable, "-m", "gunicorn", "app:app",
+                "--bind", f"127.0.0.1:{self.port}",
+                "--workers", str(workers),
+                "--worker-class", worker_class,
+                "--log-level", "warning",
+            ],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=dict(os.environ),
+        )
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                if self.session()("GET", "/healthz") == 200:
+                    return
+            except OSError:
+                pass
+            if time.monotonic() > deadline or self.proc.poll() is not None:
+                self.close()
+                raise RuntimeError("gunicorn did not start")
+            time.sleep(0.2)
+
+    def session(self):
+        # One keep-alive connection per load thread, reopened on failure.
+        conn = None
+
+        def send(method, path, data=None):
+            nonlocal conn
+            body = urlencode(data, doseq=True) if data is not None else None
+            headers = {"Content-Type": "application/x-www-form-urlencoded"} if body is not None else {}
+            for attempt in range(2):
+                if conn is None:
+                    conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+                try:
+                    conn.request(method, path, body, headers)
+                    response = conn.getresponse()
+                    response.read()
+                    if response.will_close:
+                        conn.close()
+                        conn = None
+                    return response.status
+                except (http.client.HTTPException, OSError):
+                    conn.close()
+                    conn = None
+                    if attempt:
+                        raise
+
+        return send
+
+    def close(self):
+        self.proc.terminate()
+        try:
+            self.proc.wait(10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+
+def run_phase(target, concurrency, jobs):
+    # jobs are (method, path, form data) tuples, shared by `concurrency`
+    # threads. Returns the per-route summary.
+    jobs = iter(jobs)
+    lock = threading.Lock()
+    latencies, errors = [], []
+
+    def worker():
+        send = target.session()
+        while True:
+            with lock:
+                job = next(jobs, None)
+            if job is None:
+                return
+            start = time.perf_counter()
+            try:
+                status = send(*job)
+            except Exception:
+                status = 0
+            took = time.perf_counter() - start
+            with lock:
+                latencies.append(took)
+                if status not in OK_STATUSES:
+                    errors.append(status)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    ms = lambda value: None if value is None else round(value * 1000, 3)
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+    }
+
+
+def seed_load(app, args, rng):
+    # Roster sizes spread geometrically from a dozen players up to
+    # --max-players, all generated; plus small ungenerated tournaments for
+    # the generate phase.
+    start = time.perf_counter()
+    sizes = [
+        max(12, round(args.max_players ** (i / max(1, args.tournaments - 1))))
+        for i in range(args.tournaments)
+    ]
+    codes = []
+    for i, size in enumerate(sizes):
+        code = f"LOAD{i:03d}"
+        seed_tournament(app, code, size)
+        codes.append(code)
+    pending = []
+    for i in range(args.generate):
+        code = f"LOADGEN{i:03d}"
+        seed_tournament(app, code, args.generate_players, generate=False)
+        pending.append(code)
+    app.app.test_client().post("/tournaments", data={"name": "Load surge", "code": "LOADSURGE"})
+
+    with app.app.app_context():
+        matches = app.get_db(readonly=True).execute(
+            "SELECT t.code, m.id FROM matches m JOIN tournaments t ON t.id = m.tournament_id"
+        ).fetchall()
+    matches = [(m["code"], m["id"]) for m in matches]
+    rng.shuffle(matches)
+    return {
+        "codes": codes,
+        "pending": pending,
+        "matches": matches,
+        "summary": {
+            "tournaments": len(codes),
+            "players": sum(sizes),
+            "largest": max(sizes),
+            "matches": len(matches),
+            "seconds": round(time.perf_counter() - start, 2),
+        },
+    }
+
+
+def load_jobs(route, seed, n, rng):
+    codes = seed["codes"]
+    if route == "create_tournament":
+        return [("POST", "/tournaments", {"name": f"Load new {i}", "code": f"LOADNEW{i:06d}"}) for i in range(n)]
+    if route == "join_page":
+        return [("GET", f"/join/{rng.choice(codes)}") for _ in range(n)]
+    if route == "join_submit":
+        return [
+            ("POST", "/join/LOADSURGE", {
+                "gamertag": f"surge{i:06d}",
+                "days": rng.sample(["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"], 3),
+                "time_window": rng.choice(["6pm-8pm", "8pm-10pm", "8pm-11pm"]),
+            })
+            for i in range(n)
+        ]
+    if route == "generate_tournament":
+        return [("POST", f"/admin/{code}/generate") for code in seed["pending"]]
+    if route == "tournament_view":
+        return [("GET", f"/t/{rng.choice(codes)}") for _ in range(n)]
+    if route == "set_winner":
+        picks = [seed["matches"][i % len(seed["matches"])] for i in range(n)]
+        return [("POST", f"/t/{code}/match/{match_id}/winner", {"winner": rng.choice("AB")}) for code, match_id in picks]
+    raise ValueError(route)
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    # Regressions as strings: p95 slower, or throughput lower, by more than
+    # `tolerance` (a fraction) on any route present in both runs.
+    problems = []
+    for route, base in baseline["routes"].items():
+        now = results["routes"].get(route)
+        if not now:
+            continue
+        if now["errors"] > base["errors"]:
+            problems.append(f"{route}: {now['errors']} errors (baseline {base['errors']})")
+        if base["p95_ms"] and now["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            problems.append(f"{route}: p95 {now['p95_ms']} ms vs baseline {base['p95_ms']} ms")
+        if base["rps"] and now["rps"] < base["rps"] * (1 - tolerance):
+            problems.append(f"{route}: {now['rps']} req/s vs baseline {base['rps']} req/s")
+    return problems
+
+
+def bench_load(args):
+    app = load_app()
+    rng = random.Random(args.seed)
+    seed = seed_load(app, args, rng)
+
+    if args.target == "gunicorn":
+        target = GunicornTarget(args.workers, args.worker_class)
+    else:
+        target = ClientTarget(app)
+    try:
+        routes = {}
+        for route in args.routes or LOAD_ROUTES:
+            routes[route] = run_phase(target, args.concurrency, load_jobs(route, seed, args.requests, rng))
+            print(f"{route:<20} {routes[route]}", file=sys.stderr)
+    finally:
+        target.close()
+
+    results = {
+        "target": args.target,
+        "concurrency": args.concurrency,
+        "seed": seed["summary"],
+        "routes": routes,
+    }
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            f.write(text + "\n")
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare_to_baseline(results, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}", file=sys.stderr)
+        if problems:
+            return 1
+    return 0
+
+
+COMPRESSION_PAGES = (
+    "/join/{code}",
+    "/t/{code}",
+    "/t/{code}/standings",
+    "/admin/{code}",
+    "/api/t/{code}/players",
+)
+
+
+def measure_compression(args):
+    app = load_app()
+    code = f"BENCHBYTES{args.mode.upper()}"
+    client = seed_tournament(app, code, args.players)
+    headers = {"Accept-Encoding": "gzip, deflate, br"}
+    results = {}
+    for page in COMPRESSION_PAGES:
+        url = page.format(code=code)
+        client.get(url, headers=headers)
+        start = time.process_time()
+        for _ in range(args.iterations):
+            response = client.get(url, headers=headers)
+        cpu = (time.process_time() - start) / args.iterations
+        results[page] = {
+            "bytes": len(response.data),
+            "encoding": response.headers.get("Content-Encoding", "identity"),
+            "cpu_us": round(cpu * 1e6, 1),
+        }
+    print(json.dumps(results))
+    return 0
+
+
+def bench_compression(args):
+    if args.mode:
+        return measure_compression(args)
+    runs = {}
+    for mode, env in (("before", {"MINIFY_HTML": "0", "COMPRESSION": "0"}), ("after", {})):
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "compression", "--mode", mode,
+             "--players", str(args.players), "--iterations", str(args.iterations)],
+            env=dict(os.environ, **env), capture_output=True, text=True, check=True,
+        ).stdout
+        runs[mode] = json.loads(out.splitlines()[-1])
+
+    print(f"{'page':<24}{'bytes before':>14}{'bytes after':>13}{'saved':>8}{'cpu us before':>15}{'cpu us after':>14}")
+    for page in COMPRESSION_PAGES:
+        before, after = runs["before"][page], runs["after"][page]
+        saved = 1 - after["bytes"] / before["bytes"]
+        print(
+            f"{page:<24}{before['bytes']:>14}{after['bytes']:>13}{saved:>7.0%}"
+            f"{before['cpu_us']:>15.1f}{after['cpu_us']:>14.1f}  {after['encoding']}"
+        )
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    render = sub.add_parser("render", help="per-request page render time, compiled vs cached templates")
+    render.add_argument("--players", type=int, default=200)
+    render.add_argument("--iterations", type=int, default=300)
+    render.set_defaults(func=bench_render)
+
+    signups = sub.add_parser("signups", help="concurrent POST /join throughput")
+    signups.add_argument("--threads", type=int, default=32)
+    signups.add_argument("--requests", type=int, default=3000)
+    signups.add_argument("--group-commit", action="store_true")
+    signups.set_defaults(func=bench_signups)
+
+    schedule = sub.add_parser("schedule", help="match generation time and fairness for a large lobby")
+    schedule.add_argument("--players", type=int, default=1000)
+    schedule.add_argument("--rounds", type=int, default=20)
+    schedule.add_argument("--seed", type=int, default=1)
+    schedule.add_argument("--availability", choices=("random", "all"), default="random")
+    schedule.set_defaults(func=bench_schedule)
+
+    load = sub.add_parser("load", help="seeded load test of every main route, JSON report")
+    load.add_argument("--target", choices=("client", "gunicorn"), default="client")
+    load.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    load.add_argument("--worker-class", default="gevent", help="gunicorn worker class")
+    load.add_argument("--tournaments", type=int, default=8)
+    load.add_argument("--max-players", type=int, default=10000)
+    load.add_argument("--generate", type=int, default=20, help="ungenerated tournaments for the generate phase")
+    load.add_argument("--generate-players", type=int, default=120)
+    load.add_argument("--requests", type=int, default=1000, help="requests per route")
+    load.add_argument("--concurrency", type=int, default=16)
+    load.add_argument("--routes", nargs="+", choices=LOAD_ROUTES)
+    load.add_argument("--seed", type=int, default=1)
+    load.add_argument("--output")
+    load.add_argument("--baseline")
+    load.add_argument("--save-baseline")
+    load.add_argument("--tolerance", type=float, default=0.25)
+    load.set_defaults(func=bench_load)
+
+    compression = sub.add_parser("compression", help="response bytes and CPU per request, before/after compression")
+    compression.add_argument("--players", type=int, default=500)
+    compression.add_argument("--iterations", type=int, default=200)
+    compression.add_argument("--mode", choices=("before", "after"), help=argparse.SUPPRESS)
+    compression.set_defaults(func=bench_compression)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
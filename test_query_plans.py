@@ -0,0 +1,11 @@
+import os
+import tempfile
+
+# app runs init_db at import; keep that away from a real database.
+os.environ.setdefault("DATABASE", os.path.join(tempfile.mkdtemp(prefix="test-"), "test.db"))
+
+import app  # noqa: E402
+
+
+def test_route_queries_use_indexes():
+    assert app.check_query_plans() == {}